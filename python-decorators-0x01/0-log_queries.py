@@ -1,9 +1,30 @@
 import sqlite3
 import functools
+import atexit
+import inspect
+import hashlib
+import json
+import logging
+import queue
+import random
+import re
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 
 #### decorator to log SQL queries
 def log_queries(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            query = args[0] if args else kwargs.get('query', '')
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{timestamp} Executing SQL Query: {query}")
+            result = await func(*args, **kwargs)
+            print(f"{timestamp} Query executed successfully.")
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         query = args[0] if args else kwargs.get('query', '')
@@ -15,6 +36,128 @@ def log_queries(func):
     return wrapper
 
 
+#### structured, low-overhead query logging
+query_logger = logging.getLogger("queries")
+_listener = None
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalise(query):
+    """Query text with literals replaced by ? and whitespace collapsed"""
+    return " ".join(_LITERAL_RE.sub("?", query).split()).lower()
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(query):
+    return hashlib.blake2b(normalise(query).encode(), digest_size=8).hexdigest()
+
+
+def params_hash(params):
+    if not params:
+        return None
+    return hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queues the record untouched; formatting happens on the listener"""
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = record.msg if isinstance(record.msg, dict) else {
+            "message": record.getMessage()}
+        entry = dict(entry, level=record.levelname,
+                     ts=datetime.fromtimestamp(record.created).isoformat())
+        return json.dumps(entry, default=str)
+
+
+def start_query_log(*handlers):
+    """
+    Routes the query logger through a queue drained by a background thread,
+    so callers only pay for a queue put. Defaults to JSON lines on stderr.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    if not handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        handlers = (handler,)
+    records = queue.SimpleQueue()
+    query_logger.addHandler(_DeferredQueueHandler(records))
+    query_logger.setLevel(logging.INFO)
+    query_logger.propagate = False
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def log_queries_structured(sample_rate=1.0, slow_ms=100.0):
+    """
+    Logs query fingerprint, parameters hash, elapsed time and row count.
+    Only `sample_rate` of the calls are logged, but queries slower than
+    `slow_ms` are always logged, as warnings, and failed queries are always
+    logged, as errors with the exception type in `error`.
+    """
+    def record(args, kwargs, result, elapsed_ms, error):
+        slow = elapsed_ms >= slow_ms
+        if error is None and not slow and random.random() >= sample_rate:
+            return
+        if error is not None:
+            level = logging.ERROR
+        else:
+            level = logging.WARNING if slow else logging.INFO
+        query = args[0] if args else kwargs.get('query', '')
+        params = args[1] if len(args) > 1 else kwargs.get('params')
+        query_logger.log(level, {
+            "fingerprint": fingerprint(query),
+            "query": normalise(query),
+            "params_hash": params_hash(params),
+            "elapsed_ms": round(elapsed_ms, 3),
+            "rows": len(result) if isinstance(result, (list, tuple)) else None,
+            "slow": slow,
+            # the type only: messages can quote values from the query
+            "error": type(error).__name__ if error is not None else None,
+        })
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                result = error = None
+                try:
+                    result = await func(*args, **kwargs)
+                    return result
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    record(args, kwargs, result,
+                           (time.perf_counter() - start) * 1000, error)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = error = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                record(args, kwargs, result,
+                       (time.perf_counter() - start) * 1000, error)
+        return wrapper
+    return decorator
+
 
 @log_queries
 def fetch_all_users(query):
@@ -1,10 +1,24 @@
 import sqlite3 
 import functools
+import inspect
+import instrumentation
+from db_pool import with_pooled_db_connection
 
 def with_db_connection(func):
     """opens a database connection, passes it to the function and closes it afterwards""" 
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            import aiosqlite
+            async with aiosqlite.connect('users.db') as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if instrumentation.enabled:
+            return instrumentation.call_with_connection(
+                func, lambda: sqlite3.connect('users.db'), args, kwargs)
         conn = sqlite3.connect('users.db')
         try:
             result = func(conn, *args, **kwargs)
@@ -21,4 +35,11 @@ def get_user_by_id(conn, user_id):
 #### Fetch user by ID with automatic connection handling 
 
 user = get_user_by_id(user_id=1)
-print(user)
\ No newline at end of file
+print(user)
+
+#### Same lookup on a pooled per-thread connection (statement cache stays warm)
+@with_pooled_db_connection
+def get_user_by_id_pooled(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    return cursor.fetchone()
@@ -1,10 +1,29 @@
 import sqlite3 
+import contextvars
 import functools
+import inspect
+import instrumentation
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from result_cache import WriteTracker
 
 def with_db_connection(func):
     """opens a database connection, passes it to the function and closes it afterwards""" 
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            import aiosqlite
+            async with aiosqlite.connect('users.db') as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if instrumentation.enabled:
+            return instrumentation.call_with_connection(
+                func, lambda: sqlite3.connect('users.db'), args, kwargs)
         conn = sqlite3.connect('users.db')
         try:
             result = func(conn, *args, **kwargs)
@@ -16,20 +35,356 @@ def with_db_connection(func):
 """
 function running a database operation is wrapped inside a transaction.
 If the function raises an error, rollback; otherwise commit the transaction.
+Nested calls on the same connection use savepoints, so only the outermost
+one commits; with group=GroupCommit(...) concurrent writers share commits.
 """
-def transactional(func):
+#### transactional nesting depth per connection (id -> depth), kept per
+#### thread and per asyncio task, so concurrent callers never look nested
+_tx_depth = contextvars.ContextVar("tx_depth", default=None)
+
+
+def _enter_depth(conn):
+    depths = _tx_depth.get() or {}
+    depth = depths.get(id(conn), 0)
+    return depth, _tx_depth.set({**depths, id(conn): depth + 1})
+
+
+def _exit_depth(token):
+    _tx_depth.reset(token)
+
+
+def _run_in_savepoint(conn, name, func, *args, **kwargs):
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        result = func(conn, *args, **kwargs)
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        raise
+    conn.execute(f"RELEASE {name}")
+    return result
+
+
+async def _run_in_savepoint_async(conn, name, func, *args, **kwargs):
+    await conn.execute(f"SAVEPOINT {name}")
+    try:
+        result = await func(conn, *args, **kwargs)
+    except BaseException:
+        # includes cancellation: never leave our writes in the transaction
+        await conn.execute(f"ROLLBACK TO {name}")
+        await conn.execute(f"RELEASE {name}")
+        raise
+    await conn.execute(f"RELEASE {name}")
+    return result
+
+
+def _async_transactional(func):
+    @functools.wraps(func)
+    async def wrapper(conn, *args, **kwargs):
+        depth, token = _enter_depth(conn)
+        try:
+            if depth:
+                return await _run_in_savepoint_async(conn, f"tx_{depth}", func,
+                                                     *args, **kwargs)
+            tracker = WriteTracker(conn)
+            try:
+                if not conn.in_transaction:
+                    await conn.execute("BEGIN")
+                async with tracker:
+                    result = await func(conn, *args, **kwargs)
+                await conn.commit()
+            except BaseException as e:
+                # CancelledError too, or the next caller would commit our
+                # partial writes
+                await conn.rollback()
+                print(f"Transaction failed: {e}")
+                raise
+        finally:
+            _exit_depth(token)
+        await tracker.invalidate_async()
+        return result
+    return wrapper
+
+
+def transactional(func=None, *, group=None):
+    if func is None:
+        return functools.partial(transactional, group=group)
+    if group is not None:
+        if inspect.iscoroutinefunction(func):
+            raise TypeError("group commit only supports synchronous functions")
+        return group.wrap(func)
+    if inspect.iscoroutinefunction(func):
+        return _async_transactional(func)
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
+        depth, token = _enter_depth(conn)
         try:
-            result = func(conn, *args, **kwargs)
-            conn.commit()
-            return result
-        except Exception as e:
-            conn.rollback()
-            print(f"Transaction failed: {e}")
-            raise
+            if depth:
+                # inside another transactional call: only undo our own part
+                return _run_in_savepoint(conn, f"tx_{depth}", func,
+                                         *args, **kwargs)
+            tracker = WriteTracker(conn)
+            try:
+                # open the transaction up front: a savepoint taken outside
+                # one is committed by its own RELEASE
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+                with tracker:
+                    result = func(conn, *args, **kwargs)
+                conn.commit()
+            except BaseException as e:
+                conn.rollback()
+                print(f"Transaction failed: {e}")
+                raise
+        finally:
+            _exit_depth(token)
+        # cached results for the tables we just wrote are now stale
+        tracker.invalidate()
+        return result
     return wrapper
 
+
+class GroupCommit:
+    """
+    Lets concurrent writers share one connection and one commit.
+
+    Each writer runs its function under a savepoint while holding the
+    connection, then waits for the next commit. The first writer to wait
+    becomes the leader, sleeps for `window` seconds so others can join, and
+    commits for all of them. A failed commit is raised in every writer of
+    that group.
+    """
+    def __init__(self, database='users.db', window=0.002):
+        self.conn = sqlite3.connect(database, check_same_thread=False)
+        self.window = window
+        self.commits = 0
+        self.writes = 0
+        self._work_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._leader = False
+        self._failures = {}
+        self._tracker = WriteTracker(self.conn).__enter__()
+
+    def wrap(self, func):
+        """The wrapped function is called with this group's connection"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.run(func, *args, **kwargs)
+        return wrapper
+
+    def run(self, func, *args, **kwargs):
+        with self._work_lock:
+            # the first writer opens the group's transaction; the others
+            # only add savepoints to it until the leader commits
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+            _, token = _enter_depth(self.conn)
+            try:
+                result = _run_in_savepoint(self.conn, "group_writer", func,
+                                           *args, **kwargs)
+            finally:
+                _exit_depth(token)
+            self.writes += 1
+            # any commit that starts from now on includes this write
+            covered_by = self._generation + 1
+        with self._cond:
+            lead = not self._leader
+            if lead:
+                self._leader = True
+        if lead:
+            time.sleep(self.window)
+            self._commit()
+        with self._cond:
+            while self._generation < covered_by:
+                self._cond.wait()
+            error = self._failures.get(covered_by)
+        if error is not None:
+            raise error
+        return result
+
+    def _commit(self):
+        error = None
+        with self._work_lock:
+            try:
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                print(f"Transaction failed: {e}")
+                error = e
+                self._tracker.tables.clear()
+            with self._cond:
+                self._generation += 1
+                self.commits += 1
+                if error is not None:
+                    self._failures[self._generation] = error
+                self._failures.pop(self._generation - 100, None)
+                self._leader = False
+                self._cond.notify_all()
+        if error is None:
+            self._tracker.invalidate()
+
+
+class WriteCoalescer:
+    """
+    Collects single-row writes from many callers and applies them in one
+    transaction: up to `max_items` rows, or whatever arrived within `window`
+    seconds of the first one. Each caller gets a Future with its own outcome.
+    """
+    def __init__(self, sql, database='users.db', max_items=100, window=0.01):
+        self.sql = sql
+        self.database = database
+        self.max_items = max_items
+        self.window = window
+        self.batches = 0
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, params):
+        future = Future()
+        with self._lock:
+            self._pending.put((params, future))
+            if self._worker is None:
+                self._start_worker()
+        return future
+
+    def _start_worker(self):
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        conn = None
+        batch = []
+        try:
+            conn = sqlite3.connect(self.database)
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                self._flush(conn, batch)
+                batch = []
+        except BaseException as e:
+            # nobody else would resolve these futures: fail them, don't hang
+            if conn is None:
+                batch = self._drain()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                self._worker = None
+                # submitted while this worker was stopping
+                if not self._pending.empty():
+                    self._start_worker()
+
+    def _next_batch(self):
+        item = self._pending.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._pending.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                item = self._pending.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not None:
+                items.append(item)
+
+    def _flush(self, conn, batch):
+        self.batches += 1
+        try:
+            self._write_all(conn, [params for params, _ in batch])
+        except sqlite3.Error:
+            # find out which rows failed, still in a single transaction:
+            # @transactional opens it, so the row savepoints nest inside
+            outcomes = self._write_each(conn, [params for params, _ in batch])
+        else:
+            outcomes = [None] * len(batch)
+        for (_, future), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def _write_all(self, conn, rows):
+        @transactional
+        def write(conn):
+            conn.executemany(self.sql, rows)
+        write(conn)
+
+    def _write_each(self, conn, rows):
+        @transactional
+        def write(conn):
+            outcomes = []
+            for params in rows:
+                conn.execute("SAVEPOINT coalesced_row")
+                try:
+                    conn.execute(self.sql, params)
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO coalesced_row")
+                    outcomes.append(e)
+                else:
+                    outcomes.append(None)
+                conn.execute("RELEASE coalesced_row")
+            return outcomes
+        try:
+            return write(conn)
+        except sqlite3.Error as e:
+            return [e] * len(rows)
+
+    def close(self):
+        """Applies everything already submitted, then stops the worker"""
+        self._pending.put(None)
+        with self._lock:
+            worker = self._worker
+        if worker is not None:
+            worker.join()
+
+
+def coalesce_writes(sql, max_items=100, window=0.01, database='users.db'):
+    """
+    The decorated function turns its arguments into the parameters for `sql`;
+    calls are queued and written in batches, returning a Future.
+    """
+    def decorator(func):
+        coalescer = WriteCoalescer(sql, database, max_items, window)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return coalescer.submit(func(*args, **kwargs))
+        wrapper.coalescer = coalescer
+        return wrapper
+    return decorator
+
+
+@coalesce_writes("UPDATE users SET email = ? WHERE id = ?")
+def update_user_email_batched(user_id, new_email):
+    return (new_email, user_id)
+
+
 @with_db_connection 
 @transactional 
 def update_user_email(conn, user_id, new_email): 
@@ -1,12 +1,28 @@
 import time
 import sqlite3 
 import functools
+import asyncio
+import inspect
+import instrumentation
+import random
+import threading
 
 #### paste your with_db_decorator here
 def with_db_connection(func):
     """opens a database connection, passes it to the function and closes it afterwards""" 
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            import aiosqlite
+            async with aiosqlite.connect('users.db') as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if instrumentation.enabled:
+            return instrumentation.call_with_connection(
+                func, lambda: sqlite3.connect('users.db'), args, kwargs)
         conn = sqlite3.connect('users.db')
         try:
             result = func(conn, *args, **kwargs)
@@ -15,26 +31,168 @@ def with_db_connection(func):
         return result
     return wrapper
 
-def retry_on_failure(retries=3, delay=2):
-    """Decorator to retry a function on failure"""
+class CircuitOpenError(Exception):
+    """Raised instead of calling the database while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Fails fast after `failure_threshold` consecutive transient failures.
+    After `reset_timeout` seconds one trial call is let through (half-open);
+    success closes the circuit again, failure re-opens it.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpenError("Database circuit is open, failing fast")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def record_ignored(self):
+        # a non-transient error says nothing about database health
+        with self._lock:
+            self._trial_running = False
+
+
+#### shared by every function talking to users.db
+db_circuit_breaker = CircuitBreaker()
+
+
+def is_transient(exc):
+    """Only lock/busy errors are worth retrying; anything else is a bug"""
+    if isinstance(exc, sqlite3.OperationalError):
+        message = str(exc).lower()
+        return "locked" in message or "busy" in message
+    return False
+
+
+def backoff_delays(retries, delay, backoff, max_delay, jitter):
+    """Sleep before each retry: exponential, capped, with full jitter"""
+    for attempt in range(retries - 1):
+        ceiling = min(max_delay, delay * backoff ** attempt)
+        yield random.uniform(0, ceiling) if jitter else ceiling
+
+
+def _record_retries(func, attempts):
+    if instrumentation.enabled:
+        instrumentation.observe("query_retries", attempts - 1,
+                                buckets=instrumentation.COUNT_BUCKETS,
+                                function=func.__name__)
+
+
+def retry_on_failure(retries=3, delay=2, backoff=2.0, max_delay=30.0,
+                     jitter=True, retry_if=is_transient, breaker=None):
+    """Decorator to retry a function on transient failures with backoff"""
     def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(retries):
+        def should_retry(e):
+            transient = retry_if(e)
+            if breaker is not None:
+                if transient:
+                    breaker.record_failure()
+                else:
+                    breaker.record_ignored()
+            return transient
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                delays = backoff_delays(retries, delay, backoff, max_delay, jitter)
+                for attempt in range(1, retries + 1):
+                    if breaker is not None:
+                        breaker.before_call()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        if not should_retry(e) or attempt == retries:
+                            _record_retries(func, attempt)
+                            raise
+                        wait = next(delays)
+                        print(f"Attempt {attempt} failed: {e}. Retrying in {wait:.2f} seconds...")
+                        await asyncio.sleep(wait)
+                    except BaseException:
+                        # cancelled or interrupted: free a half-open trial slot
+                        if breaker is not None:
+                            breaker.record_ignored()
+                        raise
+                    else:
+                        if breaker is not None:
+                            breaker.record_success()
+                        _record_retries(func, attempt)
+                        return result
+            return async_wrapper
+
+        def call(*args, **kwargs):
+            delays = backoff_delays(retries, delay, backoff, max_delay, jitter)
+            for attempt in range(1, retries + 1):
+                if breaker is not None:
+                    breaker.before_call()
                 try:
-                    return func(*args, **kwargs)
+                    result = instrumentation.inner(func, *args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    print(f"Attempt {attempt + 1} failed: {e}. Retrying in {delay} seconds...")
-                    time.sleep(delay)
-            print("All retry attempts failed.")
-            raise last_exception
+                    if not should_retry(e) or attempt == retries:
+                        _record_retries(func, attempt)
+                        raise
+                    wait = next(delays)
+                    print(f"Attempt {attempt} failed: {e}. Retrying in {wait:.2f} seconds...")
+                    time.sleep(wait)
+                except BaseException:
+                    # cancelled or interrupted: free a half-open trial slot
+                    if breaker is not None:
+                        breaker.record_ignored()
+                    raise
+                else:
+                    if breaker is not None:
+                        breaker.record_success()
+                    _record_retries(func, attempt)
+                    return result
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if instrumentation.enabled:
+                return instrumentation.track("retry_on_failure", call,
+                                             *args, **kwargs)
+            return call(*args, **kwargs)
         return wrapper
     return decorator
 
 @with_db_connection
-@retry_on_failure(retries=3, delay=1)
+@retry_on_failure(retries=3, delay=1, breaker=db_circuit_breaker)
 
 def fetch_users_with_retry(conn):
     cursor = conn.cursor()
@@ -1,11 +1,27 @@
-import time
 import sqlite3 
 import functools
+import inspect
+import instrumentation
+import asyncio
+import time
+from result_cache import (QueryCache, SingleFlight, call_cache, database_id,
+                          database_id_async, get_shared_cache)
 
 def with_db_connection(func):
     """opens a database connection, passes it to the function and closes it afterwards""" 
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            import aiosqlite
+            async with aiosqlite.connect('users.db') as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if instrumentation.enabled:
+            return instrumentation.call_with_connection(
+                func, lambda: sqlite3.connect('users.db'), args, kwargs)
         conn = sqlite3.connect('users.db')
         try:
             result = func(conn, *args, **kwargs)
@@ -14,25 +30,202 @@ def with_db_connection(func):
         return result
     return wrapper
 
-query_cache = {}
+#### concurrent misses for the same key run the query only once
+query_flights = SingleFlight()
 
-"""caches query results based on the SQL query string"""
-def cache_query(func):
-    @functools.wrap(func)
-    def wrapper(conn, query, *args, **kwargs):
-        if query in query_cache:
-            print("Cache hit:", query)
-            return query_cache[query]
 
+def _entry(result, ttl):
+    # results are stored with the time they stop being fresh
+    return (time.time() + ttl if ttl is not None else None, result)
+
+
+def _is_fresh(fresh_until):
+    return fresh_until is None or fresh_until > time.time()
+
+
+def _count(outcome):
+    if instrumentation.enabled:
+        instrumentation.inc("query_cache_requests_total", result=outcome)
+
+
+def _is_private(database):
+    # in-memory databases are keyed by id(conn), which CPython reuses once
+    # the connection is freed, and no other connection can refresh them
+    return database.startswith("memory:")
+
+
+def cache_query(func=None, *, ttl=None, stale_ttl=None, cache=None):
+    """
+    caches query results keyed on the database, the SQL query string and its
+    bound parameters. Entries expire after `ttl` seconds (if given), the cache
+    is LRU-bounded, and writes made through @transactional invalidate every
+    cached result that reads the written tables. Set QUERY_CACHE_PATH to share
+    the cache between processes through a sqlite file.
+
+    Concurrent misses for the same key are single-flighted: one caller runs
+    the query and the others wait for its result. With `stale_ttl`, an
+    expired entry is still served for that many seconds while it is
+    refreshed in the background, so hot keys never block on a refresh.
+    In-memory databases are never cached.
+    """
+    if func is None:
+        return functools.partial(cache_query, ttl=ttl, stale_ttl=stale_ttl,
+                                 cache=cache)
+    keep_for = ttl + stale_ttl if ttl is not None and stale_ttl else ttl
+    if inspect.iscoroutinefunction(func):
+        return _async_cache_query(func, ttl, stale_ttl, keep_for, cache)
+
+    def lookup(conn, query, *args, **kwargs):
+        store = cache if cache is not None else get_shared_cache()
+        params = args[0] if args else kwargs.get("params", ())
+        database = database_id(conn)
+        if _is_private(database):
+            _count("bypass")
+            return instrumentation.inner(func, conn, query, *args, **kwargs)
+        key = QueryCache.make_key(database, query, params)
+
+        def compute(conn):
+            # set() skips the result if a write invalidated it meanwhile
+            generation = store.generation(key)
+            result = instrumentation.inner(func, conn, query, *args, **kwargs)
+            store.set(key, _entry(result, ttl), ttl=keep_for,
+                      generation=generation)
+            return result
+
+        def refresh():
+            fresh_conn = sqlite3.connect(database)
+            try:
+                return compute(fresh_conn)
+            finally:
+                fresh_conn.close()
+
+        found, entry = store.get(key)
+        if found:
+            fresh_until, result = entry
+            if _is_fresh(fresh_until):
+                _count("hit")
+                print("Cache hit:", query)
+                return result
+            _count("stale")
+            print("Cache stale:", query)
+            query_flights.do_in_background(key, refresh)
+            return result
+
+        _count("miss")
         print("Cache miss:", query)
-        result = func(conn, query, *args, **kwargs)
-        query_cache[query] = result
-        return result
+        return query_flights.do(key, lambda: compute(conn))
+
+    @functools.wraps(func)
+    def wrapper(conn, query, *args, **kwargs):
+        if instrumentation.enabled:
+            return instrumentation.track("cache_query", lookup, conn, query,
+                                         *args, **kwargs)
+        return lookup(conn, query, *args, **kwargs)
 
     return wrapper
 
 
 
+#### in-flight async computations: (event loop, cache key) -> Future
+_inflight = {}
+
+
+async def _single_flight_async(key, compute):
+    """
+    Async counterpart of SingleFlight.do: the first caller for a key runs
+    compute(), the others await its result. If the leader is cancelled the
+    waiters elect a new one instead of being cancelled with it.
+    """
+    flight = (asyncio.get_running_loop(), key)
+    while True:
+        pending = _inflight.get(flight)
+        if pending is None:
+            break
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # shield keeps our own cancellation away from pending, so a
+            # cancelled pending means the leader went away, not us
+            if not pending.cancelled():
+                raise
+
+    pending = asyncio.get_running_loop().create_future()
+    _inflight[flight] = pending
+    try:
+        result = await compute()
+    except Exception as e:
+        pending.set_exception(e)
+        pending.exception()  # waiters get it; don't warn if there are none
+        raise
+    except BaseException:
+        pending.cancel()
+        raise
+    else:
+        pending.set_result(result)
+        return result
+    finally:
+        del _inflight[flight]
+
+
+def _async_cache_query(func, ttl, stale_ttl, keep_for, cache):
+    """
+    Async cache_query, with the same single-flight and stale-while-revalidate
+    behaviour as the sync version.
+    """
+    @functools.wraps(func)
+    async def async_wrapper(conn, query, *args, **kwargs):
+        store = cache if cache is not None else get_shared_cache()
+        params = args[0] if args else kwargs.get("params", ())
+        database = await database_id_async(conn)
+        if _is_private(database):
+            _count("bypass")
+            return await func(conn, query, *args, **kwargs)
+        key = QueryCache.make_key(database, query, params)
+
+        async def compute(conn):
+            generation = await call_cache(store.generation, key)
+            result = await func(conn, query, *args, **kwargs)
+            await call_cache(store.set, key, _entry(result, ttl), ttl=keep_for,
+                             generation=generation)
+            return result
+
+        async def refresh():
+            import aiosqlite
+            async with aiosqlite.connect(database) as fresh_conn:
+                return await compute(fresh_conn)
+
+        async def refresh_quietly():
+            try:
+                await _single_flight_async(key, refresh)
+            except Exception as e:
+                print(f"Background refresh failed: {e}")
+
+        found, entry = await call_cache(store.get, key)
+        if found:
+            fresh_until, result = entry
+            if _is_fresh(fresh_until):
+                _count("hit")
+                print("Cache hit:", query)
+                return result
+            _count("stale")
+            print("Cache stale:", query)
+            if (asyncio.get_running_loop(), key) not in _inflight:
+                task = asyncio.create_task(refresh_quietly())
+                _background.add(task)
+                task.add_done_callback(_background.discard)
+            return result
+
+        _count("miss")
+        print("Cache miss:", query)
+        return await _single_flight_async(key, lambda: compute(conn))
+
+    return async_wrapper
+
+
+#### keep references to background refresh tasks until they finish
+_background = set()
+
+
 @with_db_connection
 @cache_query
 def fetch_users_with_cache(conn, query):
@@ -0,0 +1,118 @@
+import functools
+import sqlite3
+import threading
+import weakref
+
+import instrumentation
+
+# applied once when a connection is opened
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("mmap_size", 256 * 1024 * 1024),
+)
+
+
+class _Holder:
+    """Owns one thread's connection and closes it once the thread is gone"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.close = weakref.finalize(self, conn.close)
+
+
+class ThreadLocalPool:
+    """
+    Keeps one sqlite3 connection per thread for a database file.
+
+    Reusing the connection keeps sqlite's prepared statement cache warm and
+    means pragmas are only applied once per thread. `hits` counts reuses and
+    `opens` counts new connections. A thread's connection is closed when the
+    thread ends, so short-lived threads don't leak file handles.
+    """
+
+    def __init__(self, database, pragmas=DEFAULT_PRAGMAS,
+                 cached_statements=256):
+        self.database = database
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+        self.hits = 0
+        self.opens = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._holders = weakref.WeakSet()
+
+    def acquire(self):
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            with self._lock:
+                self.hits += 1
+            return holder.conn
+        # each connection stays on its thread; close_all() may run elsewhere
+        conn = sqlite3.connect(self.database,
+                               cached_statements=self.cached_statements,
+                               check_same_thread=False)
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        # only this thread's local refers to the holder, so it is collected
+        # (and the connection closed) when the thread exits
+        holder = _Holder(conn)
+        self._local.holder = holder
+        with self._lock:
+            self.opens += 1
+            self._holders.add(holder)
+        return conn
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "opens": self.opens}
+
+    def close_all(self):
+        with self._lock:
+            holders = list(self._holders)
+            self._holders = weakref.WeakSet()
+        for holder in holders:
+            holder.close()
+        self._local = threading.local()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database="users.db"):
+    """Returns the shared pool for a database file"""
+    with _pools_lock:
+        if database not in _pools:
+            _pools[database] = ThreadLocalPool(database)
+        return _pools[database]
+
+
+def _release(conn):
+    if conn.in_transaction:
+        conn.rollback()
+
+
+def with_pooled_db_connection(func=None, *, database="users.db"):
+    """
+    Like with_db_connection, but borrows this thread's pooled connection
+    instead of opening and closing one per call.
+
+    Anything the function left uncommitted is rolled back, the same as
+    closing the connection would have done.
+    """
+    if func is None:
+        return functools.partial(with_pooled_db_connection, database=database)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if instrumentation.enabled:
+            return instrumentation.call_with_connection(
+                func, get_pool(database).acquire, args, kwargs,
+                decorator="with_pooled_db_connection", release=_release)
+        conn = get_pool(database).acquire()
+        try:
+            return func(conn, *args, **kwargs)
+        finally:
+            _release(conn)
+    return wrapper
@@ -0,0 +1,279 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+#### flip with enable()/disable() or QUERY_METRICS=1; decorators check it first
+enabled = os.environ.get("QUERY_METRICS") == "1"
+
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10)
+
+HELP = {
+    "query_decorator_overhead_seconds":
+        "Time spent in a decorator itself, excluding what it wraps",
+    "query_connection_acquire_seconds": "Time to open or borrow a connection",
+    "query_execute_seconds": "Time spent in cursor.execute/executemany",
+    "query_fetch_seconds": "Time spent fetching rows",
+    "query_retries": "Retries needed per call",
+    "query_cache_requests_total": "Cache lookups by outcome",
+}
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects"""
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, value, labels, buckets=TIME_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+registry = Registry()
+
+
+def observe(name, value, buckets=TIME_BUCKETS, **labels):
+    registry.observe(name, value, labels, buckets)
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, labels)
+
+
+#### per-thread stack of decorator frames, to split own time from inner time
+_local = threading.local()
+
+
+class _Frame:
+    __slots__ = ("inner",)
+
+    def __init__(self):
+        self.inner = 0.0
+
+
+def track(decorator, fn, *args, **kwargs):
+    """
+    Runs fn and records how long it took minus the time spent in inner()
+    calls, i.e. the decorator's own overhead.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    frame = _Frame()
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        total = time.perf_counter() - start
+        stack.pop()
+        observe("query_decorator_overhead_seconds",
+                max(0.0, total - frame.inner), decorator=decorator)
+
+
+def inner(fn, *args, **kwargs):
+    """Calls the wrapped function, charging its time to the wrapped layer"""
+    if not enabled:
+        return fn(*args, **kwargs)
+    stack = getattr(_local, "stack", None)
+    if not stack:
+        return fn(*args, **kwargs)
+    frame = stack[-1]
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        frame.inner += time.perf_counter() - start
+
+
+class TimedCursor:
+    """Cursor proxy that times execute and fetch calls"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # one row at a time, like the real cursor
+        return self._timed("query_fetch_seconds", "__next__", method="next")
+
+    def _timed(self, metric, attr, *args, **labels):
+        start = time.perf_counter()
+        try:
+            return getattr(self._cursor, attr)(*args)
+        finally:
+            observe(metric, time.perf_counter() - start, **labels)
+
+    def execute(self, *args):
+        self._timed("query_execute_seconds", "execute", *args)
+        return self
+
+    def executemany(self, *args):
+        self._timed("query_execute_seconds", "executemany", *args)
+        return self
+
+    def fetchone(self):
+        return self._timed("query_fetch_seconds", "fetchone", method="fetchone")
+
+    def fetchmany(self, *args):
+        return self._timed("query_fetch_seconds", "fetchmany", *args,
+                           method="fetchmany")
+
+    def fetchall(self):
+        return self._timed("query_fetch_seconds", "fetchall", method="fetchall")
+
+
+class TimedConnection:
+    """sqlite3 connection proxy whose cursors are TimedCursors"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def cursor(self, *args):
+        return TimedCursor(self._conn.cursor(*args))
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+def _close(conn):
+    conn.close()
+
+
+def call_with_connection(func, connect, args, kwargs,
+                         decorator="with_db_connection", release=_close):
+    """
+    Instrumented body of with_db_connection: records connection-acquire
+    time and the decorator's overhead, and times queries through proxies.
+    `release` hands the connection back (closes it by default).
+    """
+    def run():
+        start = time.perf_counter()
+        conn = connect()
+        observe("query_connection_acquire_seconds",
+                time.perf_counter() - start, decorator=decorator)
+        try:
+            return inner(func, TimedConnection(conn), *args, **kwargs)
+        finally:
+            release(conn)
+    return track(decorator, run)
+
+
+def _labels(labels, **extra):
+    items = list(labels) + sorted(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def _bound(value):
+    return "+Inf" if value == float("inf") else repr(value)
+
+
+def to_prometheus():
+    """Current metrics in the Prometheus text exposition format"""
+    lines = []
+    with registry._lock:
+        histograms = sorted(registry.histograms.items())
+        counters = sorted(registry.counters.items())
+    seen = set()
+    for (name, labels), histogram in histograms:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        for bound, count in histogram.cumulative():
+            lines.append(
+                f"{name}_bucket{_labels(labels, le=_bound(bound))} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def to_json():
+    """Current metrics as a JSON string"""
+    with registry._lock:
+        histograms = [{
+            "name": name,
+            "labels": dict(labels),
+            "count": histogram.count,
+            "sum": histogram.sum,
+            "buckets": {_bound(bound): count
+                        for bound, count in histogram.cumulative()},
+        } for (name, labels), histogram in sorted(registry.histograms.items())]
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(registry.counters.items())]
+    return json.dumps({"histograms": histograms, "counters": counters})
@@ -0,0 +1,536 @@
+import asyncio
+import hashlib
+import marshal
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping
+
+_TABLE_RE = re.compile(
+    r"\b(?:FROM|JOIN|INTO|UPDATE|TABLE)\s+[\"`\[]?(\w+)", re.IGNORECASE)
+_WRITE_RE = re.compile(
+    r"^\s*(?:INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b",
+    re.IGNORECASE)
+
+
+def tables_in(query):
+    """Returns the lower-cased table names a SQL statement mentions"""
+    return frozenset(name.lower() for name in _TABLE_RE.findall(query))
+
+
+def is_write(query):
+    return bool(_WRITE_RE.match(query))
+
+
+def database_id(conn):
+    """
+    Identifies the database behind a sqlite3 connection by its main file,
+    so cached results are never shared between databases.
+    """
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    # in-memory and temporary databases are private to their connection
+    return path or f"memory:{id(conn)}"
+
+
+async def database_id_async(conn):
+    """database_id for an aiosqlite connection"""
+    async with conn.execute("PRAGMA database_list") as cursor:
+        path = (await cursor.fetchone())[2]
+    return path or f"memory:{id(conn)}"
+
+
+class QueryCache:
+    """
+    LRU cache of query results with optional per-entry TTL.
+
+    Keys are (database, query, params). Every entry is tagged with the
+    tables its query reads, so invalidate() can drop all results that
+    depend on a table once it has been written to.
+
+    invalidate() also bumps a generation counter per table. A caller that
+    reads generation(key) before running the query and passes it to set()
+    never stores a result computed before a write it raced with.
+    """
+
+    # in-memory: cheap enough to call straight from a coroutine
+    blocking = False
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._generations = {}
+        self._lock = threading.RLock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def make_key(database, query, params=()):
+        if isinstance(params, list):
+            params = tuple(params)
+        elif isinstance(params, Mapping):
+            # named parameters (:id); dicts are unhashable and unordered
+            params = tuple(sorted(params.items()))
+        return (database, " ".join(query.split()), params)
+
+    def get(self, key):
+        """Returns (True, value) on a hit, (False, None) otherwise"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, value
+                self._stats["expirations"] += 1
+                self._drop(key)
+            self._stats["misses"] += 1
+            return False, None
+
+    def generation(self, key):
+        database, query, _ = key
+        with self._lock:
+            return tuple(self._generations.get((database, table), 0)
+                         for table in sorted(tables_in(query)))
+
+    def set(self, key, value, ttl=None, generation=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        database, query, _ = key
+        tags = {(database, table) for table in tables_in(query)}
+        with self._lock:
+            if generation is not None and self.generation(key) != generation:
+                # a table was written while the result was computed
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, expires_at, tags)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, database, tables):
+        """Drops every cached result that reads one of `tables`"""
+        with self._lock:
+            for table in tables:
+                tag = (database, table.lower())
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._drop(key)
+                        self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        return stats
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+_MARSHAL = b"m"
+_PICKLE = b"p"
+
+
+def dumps(value):
+    """
+    Serializes a query result. Rows of plain values (what sqlite3 returns)
+    go through marshal, which is much cheaper than pickle for them.
+    """
+    try:
+        return _MARSHAL + marshal.dumps(value)
+    except ValueError:
+        return _PICKLE + pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data):
+    data = bytes(data)
+    if data[:1] == _MARSHAL:
+        return marshal.loads(data[1:])
+    return pickle.loads(data[1:])
+
+
+class SqliteQueryCache:
+    """
+    QueryCache stored in a sqlite file so several processes share it.
+
+    Point `path` at a tmpfs such as /dev/shm to keep it in shared memory.
+    The file is memory-mapped and written without fsync, since losing the
+    cache only costs a recomputation. Hit/miss counters are per process.
+
+    Values are unpickled when read, so the file is created with mode 0600
+    and refused if another user owns it.
+    """
+
+    # file I/O: coroutines run its methods in a thread, see call_cache()
+    blocking = True
+
+    # expiring and evicting only every few writes keeps set() cheap
+    EVICT_EVERY = 32
+    TOUCH_AFTER = 1.0
+
+    def __init__(self, path, max_entries=10000, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+        self._check_owner(path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key BLOB PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL,
+                    last_used REAL NOT NULL
+                )""")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_used "
+                "ON entries (last_used)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tags (
+                    tag TEXT NOT NULL,
+                    key BLOB NOT NULL,
+                    PRIMARY KEY (tag, key)
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS generations (
+                    tag TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                )""")
+            # evictions and invalidations delete tags by key
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS tags_key ON tags (key)")
+
+    make_key = staticmethod(QueryCache.make_key)
+
+    @staticmethod
+    def _check_owner(path):
+        # anyone who can write the cache can run code in every reader
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            info = os.fstat(fd)
+            if info.st_uid != os.getuid():
+                raise PermissionError(f"{path} is owned by another user")
+            if info.st_mode & 0o077:
+                os.fchmod(fd, 0o600)
+        finally:
+            os.close(fd)
+        # sqlite replays an existing WAL into the database on open
+        for suffix in ("-wal", "-shm"):
+            try:
+                info = os.lstat(path + suffix)
+            except FileNotFoundError:
+                continue
+            if info.st_uid != os.getuid():
+                raise PermissionError(
+                    f"{path + suffix} is owned by another user")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        # a connection inherited through fork (e.g. gunicorn --preload)
+        # must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute(f"PRAGMA mmap_size = {64 * 1024 * 1024}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _digest(key):
+        # marshal output depends on interning and object sharing, so it is
+        # not stable for equal keys; repr of plain values is
+        return hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        conn = self._connect()
+        digest = self._digest(key)
+        row = conn.execute(
+            "SELECT value, expires_at, last_used FROM entries WHERE key = ?",
+            (digest,)).fetchone()
+        now = time.time()
+        if row is not None:
+            value, expires_at, last_used = row
+            if expires_at is None or expires_at > now:
+                # LRU order only needs to be roughly right; skip the write
+                # for entries that were touched recently
+                if now - last_used > self.TOUCH_AFTER:
+                    with conn:
+                        conn.execute(
+                            "UPDATE entries SET last_used = ? WHERE key = ?",
+                            (now, digest))
+                self._count("hits")
+                return True, loads(value)
+            self._count("expirations")
+            with conn:
+                self._delete(conn, [digest])
+        self._count("misses")
+        return False, None
+
+    def generation(self, key):
+        return self._generation(self._connect(), key)
+
+    def _generation(self, conn, key):
+        database, query, _ = key
+        generations = []
+        for table in sorted(tables_in(query)):
+            row = conn.execute(
+                "SELECT generation FROM generations WHERE tag = ?",
+                (self._tag(database, table),)).fetchone()
+            generations.append(row[0] if row else 0)
+        return tuple(generations)
+
+    def set(self, key, value, ttl=None, generation=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        database, query, _ = key
+        digest = self._digest(key)
+        conn = self._connect()
+        with conn:
+            if generation is not None:
+                # hold the write lock so no invalidation slips in between
+                conn.execute("BEGIN IMMEDIATE")
+                if self._generation(conn, key) != generation:
+                    return
+            conn.execute(
+                "REPLACE INTO entries (key, value, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?)", (digest, dumps(value), expires_at, now))
+            conn.executemany(
+                "INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)",
+                [(self._tag(database, table), digest)
+                 for table in tables_in(query)])
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        if evict:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        with conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT key FROM entries WHERE expires_at <= ?", (now,))]
+            self._delete(conn, expired)
+            excess = conn.execute(
+                "SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            oldest = []
+            if excess > 0:
+                oldest = [row[0] for row in conn.execute(
+                    "SELECT key FROM entries ORDER BY last_used LIMIT ?",
+                    (excess,))]
+                self._delete(conn, oldest)
+        self._count("expirations", len(expired))
+        self._count("evictions", len(oldest))
+
+    def invalidate(self, database, tables):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO generations (tag, generation) VALUES (?, 1) "
+                "ON CONFLICT (tag) DO UPDATE SET generation = generation + 1",
+                [(self._tag(database, table),) for table in tables])
+            keys = [row[0] for table in tables for row in conn.execute(
+                "SELECT key FROM tags WHERE tag = ?",
+                (self._tag(database, table),))]
+            self._delete(conn, keys)
+        self._count("invalidations", len(keys))
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM tags")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self._connect().execute(
+            "SELECT COUNT(*) FROM entries").fetchone()[0]
+        return stats
+
+    @staticmethod
+    def _tag(database, table):
+        return f"{database}\x1f{table.lower()}"
+
+    @staticmethod
+    def _delete(conn, keys):
+        params = [(key,) for key in keys]
+        conn.executemany("DELETE FROM entries WHERE key = ?", params)
+        conn.executemany("DELETE FROM tags WHERE key = ?", params)
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one: the first thread
+    runs the function, the others wait for its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._flights
+
+    def do_in_background(self, key, fn):
+        """Starts fn in a thread unless a call for `key` is already running"""
+        if self.in_flight(key):
+            return
+
+        def run():
+            try:
+                self.do(key, fn)
+            except Exception as e:
+                print(f"Background refresh failed: {e}")
+        threading.Thread(target=run, daemon=True).start()
+
+
+async def call_cache(method, *args, **kwargs):
+    """
+    Calls a cache method from a coroutine without blocking the event loop
+    on caches that do file I/O.
+    """
+    if getattr(method.__self__, "blocking", False):
+        return await asyncio.to_thread(method, *args, **kwargs)
+    return method(*args, **kwargs)
+
+
+def _default_cache():
+    # e.g. QUERY_CACHE_PATH=/dev/shm/query_cache.db shares hits across workers
+    path = os.environ.get("QUERY_CACHE_PATH")
+    return SqliteQueryCache(path) if path else QueryCache()
+
+
+# shared by cache_query and the transactional writer path
+shared_cache = _default_cache()
+
+
+def get_shared_cache():
+    return shared_cache
+
+
+def set_shared_cache(cache):
+    """Swaps the cache used by cache_query and transactional"""
+    global shared_cache
+    shared_cache = cache
+
+
+class WriteTracker:
+    """
+    Records the tables written on a connection (through sqlite3's trace
+    callback) so their cached results can be invalidated after commit.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.tables = set()
+
+    def _trace(self, statement):
+        if is_write(statement):
+            self.tables.update(tables_in(statement))
+
+    def __enter__(self):
+        self.conn.set_trace_callback(self._trace)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.conn.set_trace_callback(None)
+        return False
+
+    async def __aenter__(self):
+        await self.conn.set_trace_callback(self._trace)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.conn.set_trace_callback(None)
+        return False
+
+    def invalidate(self, cache=None):
+        if self.tables:
+            cache = cache if cache is not None else shared_cache
+            cache.invalidate(database_id(self.conn), self.tables)
+            self.tables.clear()
+
+    async def invalidate_async(self, cache=None):
+        if self.tables:
+            cache = cache if cache is not None else shared_cache
+            await call_cache(cache.invalidate,
+                             await database_id_async(self.conn), self.tables)
+            self.tables.clear()
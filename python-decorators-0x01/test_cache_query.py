@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Unit tests for 4-cache_query.py, run against a throwaway users.db.
+"""
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import result_cache  # noqa: E402
+from test_transactional import make_users_db  # noqa: E402
+
+_cwd = os.getcwd()
+_tmp = None
+cq = None
+tx = None
+
+
+def setUpModule():
+    global _tmp, cq, tx
+    _tmp = tempfile.mkdtemp()
+    os.chdir(_tmp)
+    make_users_db("users.db")
+    cq = __import__('4-cache_query')
+    tx = __import__('2-transactional')
+
+
+def tearDownModule():
+    os.chdir(_cwd)
+    shutil.rmtree(_tmp)
+
+
+class TestCacheInvalidationRace(unittest.TestCase):
+    '''A result computed before a racing write is never cached'''
+    query = "SELECT name FROM users ORDER BY id"
+
+    def setUp(self):
+        self.path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(self.path)
+        self.cache = result_cache.QueryCache()
+        self.previous = result_cache.get_shared_cache()
+        result_cache.set_shared_cache(self.cache)
+
+    def tearDown(self):
+        result_cache.set_shared_cache(self.previous)
+
+    def test_write_committed_during_a_miss_is_not_hidden(self):
+        @tx.transactional
+        def add(conn):
+            conn.execute("INSERT INTO users (name, email) VALUES (?, ?)",
+                         ("Carol", "carol@example.com"))
+
+        writes = []
+
+        @cq.cache_query
+        def fetch(conn, query):
+            rows = conn.execute(query).fetchall()
+            if not writes:
+                # the write commits and invalidates after our read
+                writer = sqlite3.connect(self.path)
+                add(writer)
+                writer.close()
+                writes.append(True)
+            return rows
+
+        conn = sqlite3.connect(self.path)
+        self.assertEqual(len(fetch(conn, self.query)), 2)
+        self.assertEqual(len(fetch(conn, self.query)), 3)
+        conn.close()
+
+
+class TestInMemoryDatabases(unittest.TestCase):
+    '''In-memory databases are never served another connection's rows'''
+    def test_new_connection_does_not_see_old_results(self):
+        @cq.cache_query(cache=result_cache.QueryCache())
+        def fetch(conn, query):
+            return conn.execute(query).fetchall()
+
+        for name in ("Alice", "Bob"):
+            conn = sqlite3.connect(":memory:")
+            conn.execute("CREATE TABLE users (name TEXT)")
+            conn.execute("INSERT INTO users VALUES (?)", (name,))
+            self.assertEqual(fetch(conn, "SELECT name FROM users"), [(name,)])
+            conn.close()
+            del conn
+
+
+class TestNamedParameters(unittest.TestCase):
+    '''Queries with a dict of named parameters are cached too'''
+    def test_named_parameters_are_cached(self):
+        path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(path)
+        calls = []
+
+        @cq.cache_query(cache=result_cache.QueryCache())
+        def fetch(conn, query, params):
+            calls.append(1)
+            return conn.execute(query, params).fetchall()
+
+        conn = sqlite3.connect(path)
+        query = "SELECT name FROM users WHERE id = :id"
+        self.assertEqual(fetch(conn, query, {"id": 1}), [("Alice",)])
+        self.assertEqual(fetch(conn, query, {"id": 1}), [("Alice",)])
+        self.assertEqual(fetch(conn, query, {"id": 2}), [("Bob",)])
+        conn.close()
+        self.assertEqual(len(calls), 2)
+
+
+class TestSingleFlight(unittest.TestCase):
+    '''Concurrent misses for one key run the query once'''
+    query = "SELECT name FROM users ORDER BY id"
+
+    def setUp(self):
+        self.path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(self.path)
+        self.cache = result_cache.QueryCache()
+
+    def run_concurrently(self, fetch, callers=6):
+        barrier = threading.Barrier(callers)
+        results = []
+
+        def call():
+            conn = sqlite3.connect(self.path)
+            barrier.wait()
+            try:
+                results.append(fetch(conn, self.query))
+            except Exception as e:
+                results.append(e)
+            finally:
+                conn.close()
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_query_runs_once_for_concurrent_misses(self):
+        calls = []
+
+        @cq.cache_query(cache=self.cache)
+        def fetch(conn, query):
+            calls.append(1)
+            time.sleep(0.1)
+            return conn.execute(query).fetchall()
+
+        results = self.run_concurrently(fetch)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [[("Alice",), ("Bob",)]] * 6)
+
+    def test_error_reaches_every_waiter_and_is_not_cached(self):
+        calls = []
+
+        @cq.cache_query(cache=self.cache)
+        def fetch(conn, query):
+            calls.append(1)
+            time.sleep(0.1)
+            raise sqlite3.OperationalError("database is locked")
+
+        results = self.run_concurrently(fetch)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, sqlite3.OperationalError)
+                            for result in results))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+    '''Cancelling the leader of an async flight does not cancel its waiters'''
+    def test_waiter_takes_over_from_a_cancelled_leader(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        async def main():
+            leader = asyncio.create_task(cq._single_flight_async("k", compute))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(cq._single_flight_async("k", compute))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        self.assertEqual(asyncio.run(main()), 2)
+        self.assertEqual(len(calls), 2)
+
+    def test_cancelled_waiter_leaves_the_leader_running(self):
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "rows"
+
+        async def main():
+            leader = asyncio.create_task(cq._single_flight_async("k", compute))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(cq._single_flight_async("k", compute))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            return await leader
+
+        self.assertEqual(asyncio.run(main()), "rows")
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    '''Expired entries are served while a refresh runs in the background'''
+    query = "SELECT name FROM users ORDER BY id"
+
+    def setUp(self):
+        self.path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(self.path)
+        self.conn = sqlite3.connect(self.path)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_stale_result_is_served_then_refreshed(self):
+        cache = result_cache.QueryCache()
+        calls = []
+
+        @cq.cache_query(ttl=0.05, stale_ttl=10, cache=cache)
+        def fetch(conn, query):
+            calls.append(1)
+            time.sleep(0.2)
+            return conn.execute(query).fetchall()
+
+        self.assertEqual(len(fetch(self.conn, self.query)), 2)
+        writer = sqlite3.connect(self.path)
+        writer.execute("INSERT INTO users (name, email) VALUES (?, ?)",
+                       ("Carol", "carol@example.com"))
+        writer.commit()
+        writer.close()
+        time.sleep(0.06)
+
+        start = time.monotonic()
+        self.assertEqual(len(fetch(self.conn, self.query)), 2)
+        self.assertLess(time.monotonic() - start, 0.1)
+
+        deadline = time.monotonic() + 5
+        while len(calls) < 2 or self.cache_is_refreshing(cache):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.assertEqual(len(fetch(self.conn, self.query)), 3)
+        self.assertEqual(len(calls), 2)
+
+    def cache_is_refreshing(self, cache):
+        key = cache.make_key(self.path, self.query)
+        return cq.query_flights.in_flight(key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Unit tests for db_pool.py, run against a throwaway users.db.
+"""
+import gc
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db_pool  # noqa: E402
+from test_transactional import count_users, make_users_db  # noqa: E402
+
+_tmp = None
+
+
+def setUpModule():
+    global _tmp
+    _tmp = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(_tmp)
+
+
+class TestThreadLocalPool(unittest.TestCase):
+    '''ThreadLocalPool keeps one connection per live thread'''
+    def setUp(self):
+        self.path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(self.path)
+        self.pool = db_pool.ThreadLocalPool(self.path)
+
+    def tearDown(self):
+        self.pool.close_all()
+
+    def test_connection_is_reused_on_the_same_thread(self):
+        first = self.pool.acquire()
+        self.assertIs(self.pool.acquire(), first)
+        self.assertEqual(self.pool.stats(), {"hits": 1, "opens": 1})
+
+    def test_pragmas_are_applied_once(self):
+        conn = self.pool.acquire()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        self.pool.acquire()
+        conn.set_trace_callback(None)
+        self.assertEqual(statements, [])
+        mode, = conn.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual(mode, "wal")
+
+    def test_each_thread_gets_its_own_connection(self):
+        seen = []
+        thread = threading.Thread(
+            target=lambda: seen.append(self.pool.acquire()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(seen[0], self.pool.acquire())
+        self.assertEqual(self.pool.stats()["opens"], 2)
+
+    def test_connection_is_closed_when_its_thread_ends(self):
+        seen = []
+        thread = threading.Thread(
+            target=lambda: seen.append(self.pool.acquire()))
+        thread.start()
+        thread.join()
+        gc.collect()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            seen[0].execute("SELECT 1")
+        self.assertEqual(len(self.pool._holders), 0)
+
+    def test_close_all(self):
+        conn = self.pool.acquire()
+        self.pool.close_all()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        self.assertIsNot(self.pool.acquire(), conn)
+
+
+class TestWithPooledDbConnection(unittest.TestCase):
+    '''with_pooled_db_connection rolls back whatever was left open'''
+    def test_uncommitted_writes_are_rolled_back_on_release(self):
+        path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(path)
+
+        @db_pool.with_pooled_db_connection(database=path)
+        def add(conn):
+            conn.execute("INSERT INTO users (name, email) VALUES (?, ?)",
+                         ("Carol", "carol@example.com"))
+            return conn
+
+        conn = add()
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(count_users(path), 2)
+        db_pool.get_pool(path).close_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Unit tests for instrumentation.py: the timed connection and cursor
+proxies must behave like the sqlite3 objects they wrap.
+"""
+import json
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import instrumentation  # noqa: E402
+
+
+def metric_count(name, **labels):
+    for histogram in json.loads(instrumentation.to_json())["histograms"]:
+        if histogram["name"] == name and histogram["labels"] == labels:
+            return histogram["count"]
+    return 0
+
+
+class TestTimedConnection(unittest.TestCase):
+    '''TimedConnection/TimedCursor around an in-memory database'''
+    def setUp(self):
+        instrumentation.registry.reset()
+        raw = sqlite3.connect(":memory:")
+        raw.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        raw.executemany("INSERT INTO users (name) VALUES (?)",
+                        [("Alice",), ("Bob",), ("Carol",)])
+        raw.commit()
+        self.conn = instrumentation.TimedConnection(raw)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_connection_is_a_context_manager(self):
+        '''with conn: commits on success and rolls back on error'''
+        with self.conn as conn:
+            self.assertIs(conn, self.conn)
+            conn.execute("INSERT INTO users (name) VALUES ('Dave')")
+        with self.assertRaises(ValueError):
+            with self.conn:
+                self.conn.execute("DELETE FROM users")
+                raise ValueError("undo")
+        count = self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        self.assertEqual(count, 4)
+
+    def test_iterating_a_cursor_fetches_row_by_row(self):
+        '''for row in cursor streams rows and times each fetch'''
+        cursor = self.conn.execute("SELECT name FROM users ORDER BY id")
+        self.assertEqual(next(cursor), ("Alice",))
+        self.assertEqual(metric_count("query_fetch_seconds", method="next"), 1)
+        self.assertEqual([row for row in cursor], [("Bob",), ("Carol",)])
+        self.assertEqual(metric_count("query_fetch_seconds", method="fetchall"),
+                         0)
+
+    def test_execute_and_fetch_are_timed(self):
+        self.conn.cursor().execute("SELECT * FROM users").fetchall()
+        self.assertEqual(metric_count("query_execute_seconds"), 1)
+        self.assertEqual(metric_count("query_fetch_seconds", method="fetchall"),
+                         1)
+
+
+if __name__ == '__main__':
+    unittest.main()
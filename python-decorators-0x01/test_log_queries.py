@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Unit tests for 0-log_queries.py, run against a throwaway users.db.
+"""
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_transactional import make_users_db  # noqa: E402
+
+_cwd = os.getcwd()
+_tmp = None
+lq = None
+
+
+def setUpModule():
+    global _tmp, lq
+    _tmp = tempfile.mkdtemp()
+    os.chdir(_tmp)
+    make_users_db("users.db")
+    lq = __import__('0-log_queries')
+
+
+def tearDownModule():
+    os.chdir(_cwd)
+    shutil.rmtree(_tmp)
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestLogQueriesStructured(unittest.TestCase):
+    '''log_queries_structured records successes and failures'''
+    def setUp(self):
+        self.handler = Collect()
+        lq.query_logger.addHandler(self.handler)
+        lq.query_logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        lq.query_logger.removeHandler(self.handler)
+
+    def test_success_is_logged_with_row_count(self):
+        @lq.log_queries_structured()
+        def fetch(query, params=()):
+            with sqlite3.connect("users.db") as conn:
+                return conn.execute(query, params).fetchall()
+
+        fetch("SELECT * FROM users WHERE id = ?", (1,))
+        record, = self.handler.records
+        self.assertEqual(record.levelno, logging.INFO)
+        self.assertEqual(record.msg["rows"], 1)
+        self.assertIsNone(record.msg["error"])
+
+    def test_failure_is_always_logged(self):
+        @lq.log_queries_structured(sample_rate=0.0)
+        def fetch(query):
+            raise sqlite3.OperationalError("database is locked")
+
+        with self.assertRaises(sqlite3.OperationalError):
+            fetch("SELECT * FROM users")
+        record, = self.handler.records
+        self.assertEqual(record.levelno, logging.ERROR)
+        self.assertEqual(record.msg["error"], "OperationalError")
+        self.assertEqual(record.msg["query"], "select * from users")
+
+
+if __name__ == '__main__':
+    unittest.main()
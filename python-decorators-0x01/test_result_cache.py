@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Unit tests for result_cache.py.
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import result_cache  # noqa: E402
+
+
+class RecordThread:
+    '''Remembers which thread get() ran on'''
+    def get(self, key):
+        self.thread = threading.get_ident()
+        return super().get(key)
+
+
+class RecordingSqliteCache(RecordThread, result_cache.SqliteQueryCache):
+    pass
+
+
+class RecordingMemoryCache(RecordThread, result_cache.QueryCache):
+    pass
+
+
+class TestCallCache(unittest.TestCase):
+    '''call_cache keeps file-backed caches off the event loop'''
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def ran_in_a_thread(self, cache):
+        key = cache.make_key("db", "SELECT * FROM users")
+        cache.set(key, [(1, "Alice")])
+
+        async def main():
+            return await result_cache.call_cache(cache.get, key)
+
+        self.assertEqual(asyncio.run(main()), (True, [(1, "Alice")]))
+        return cache.thread != threading.get_ident()
+
+    def test_sqlite_cache_runs_in_a_thread(self):
+        cache = RecordingSqliteCache(os.path.join(self.tmp, "c.db"))
+        self.assertTrue(self.ran_in_a_thread(cache))
+
+    def test_memory_cache_runs_inline(self):
+        self.assertFalse(self.ran_in_a_thread(RecordingMemoryCache()))
+
+
+class TestSqliteQueryCacheFile(unittest.TestCase):
+    '''The shared cache file is private to its owner'''
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "cache.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_new_file_is_private(self):
+        result_cache.SqliteQueryCache(self.path)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_existing_file_is_made_private(self):
+        with open(self.path, "wb"):
+            pass
+        os.chmod(self.path, 0o666)
+        result_cache.SqliteQueryCache(self.path)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    @unittest.skipUnless(os.getuid() == 0, "needs root to chown")
+    def test_file_owned_by_another_user_is_refused(self):
+        with open(self.path, "wb"):
+            pass
+        os.chown(self.path, 12345, 12345)
+        with self.assertRaises(PermissionError):
+            result_cache.SqliteQueryCache(self.path)
+
+    def test_symlink_is_refused(self):
+        os.symlink(os.path.join(self.tmp, "elsewhere.db"), self.path)
+        with self.assertRaises(OSError):
+            result_cache.SqliteQueryCache(self.path)
+
+    def test_deleting_tags_by_key_uses_an_index(self):
+        cache = result_cache.SqliteQueryCache(self.path)
+        plan = cache._connect().execute(
+            "EXPLAIN QUERY PLAN DELETE FROM tags WHERE key = ?",
+            (b"k",)).fetchall()
+        self.assertIn("tags_key", " ".join(row[-1] for row in plan))
+
+
+class TestMakeKey(unittest.TestCase):
+    '''make_key turns every sqlite3 parameter style into a hashable key'''
+    def test_named_parameters(self):
+        key = result_cache.QueryCache.make_key(
+            "db", "SELECT * FROM users WHERE id = :id AND name = :name",
+            {"name": "Alice", "id": 1})
+        hash(key)
+        self.assertEqual(key, result_cache.QueryCache.make_key(
+            "db", "SELECT * FROM users WHERE id = :id AND name = :name",
+            {"id": 1, "name": "Alice"}))
+
+    def test_list_and_tuple_parameters_match(self):
+        self.assertEqual(
+            result_cache.QueryCache.make_key("db", "SELECT ?", [1]),
+            result_cache.QueryCache.make_key("db", "SELECT ?", (1,)))
+
+
+class GenerationTests:
+    '''set() skips results computed before a racing invalidation'''
+    key = ("db", "SELECT * FROM users", ())
+
+    def test_set_with_current_generation_is_stored(self):
+        generation = self.cache.generation(self.key)
+        self.cache.set(self.key, "fresh", generation=generation)
+        self.assertEqual(self.cache.get(self.key), (True, "fresh"))
+
+    def test_set_after_invalidation_is_skipped(self):
+        generation = self.cache.generation(self.key)
+        self.cache.invalidate("db", {"users"})
+        self.cache.set(self.key, "stale", generation=generation)
+        self.assertEqual(self.cache.get(self.key), (False, None))
+        self.cache.set(self.key, "fresh",
+                       generation=self.cache.generation(self.key))
+        self.assertEqual(self.cache.get(self.key), (True, "fresh"))
+
+    def test_other_tables_and_databases_do_not_count(self):
+        generation = self.cache.generation(self.key)
+        self.cache.invalidate("db", {"orders"})
+        self.cache.invalidate("other", {"users"})
+        self.cache.set(self.key, "fresh", generation=generation)
+        self.assertEqual(self.cache.get(self.key), (True, "fresh"))
+
+
+class TestQueryCacheGenerations(GenerationTests, unittest.TestCase):
+    def setUp(self):
+        self.cache = result_cache.QueryCache()
+
+
+class TestSqliteQueryCacheGenerations(GenerationTests, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = result_cache.SqliteQueryCache(
+            os.path.join(self.tmp, "cache.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Unit tests for 3-retry_on_failure.py, run against a throwaway users.db.
+"""
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_transactional import make_users_db  # noqa: E402
+
+_cwd = os.getcwd()
+_tmp = None
+rf = None
+
+
+def setUpModule():
+    global _tmp, rf
+    _tmp = tempfile.mkdtemp()
+    os.chdir(_tmp)
+    make_users_db("users.db")
+    rf = __import__('3-retry_on_failure')
+
+
+def tearDownModule():
+    os.chdir(_cwd)
+    shutil.rmtree(_tmp)
+
+
+def flaky(failures, error=None):
+    '''A function that raises `error` for its first `failures` calls'''
+    error = error or sqlite3.OperationalError("database is locked")
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return len(calls)
+    return func, calls
+
+
+class TestRetryOnFailure(unittest.TestCase):
+    '''retry_on_failure retries transient errors only'''
+    def retry(self, **kwargs):
+        return rf.retry_on_failure(delay=0.001, jitter=False, **kwargs)
+
+    def test_transient_errors_are_retried(self):
+        func, calls = flaky(2)
+        self.assertEqual(self.retry(retries=3)(func)(), 3)
+        self.assertEqual(len(calls), 3)
+
+    def test_gives_up_after_the_last_attempt(self):
+        func, calls = flaky(5)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.retry(retries=3)(func)()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        func, calls = flaky(1, sqlite3.IntegrityError("UNIQUE"))
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.retry(retries=3)(func)()
+        self.assertEqual(len(calls), 1)
+
+    def test_async_functions_are_retried(self):
+        func, calls = flaky(1)
+
+        @self.retry(retries=3)
+        async def call():
+            return func()
+
+        self.assertEqual(asyncio.run(call()), 2)
+
+    def test_backoff_delays(self):
+        self.assertEqual(list(rf.backoff_delays(5, 1, 2, 5, False)),
+                         [1, 2, 4, 5])
+        for delay, ceiling in zip(rf.backoff_delays(5, 1, 2, 5, True),
+                                  [1, 2, 4, 5]):
+            self.assertTrue(0 <= delay <= ceiling)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    '''CircuitBreaker opens, fails fast and lets one trial through'''
+    def test_opens_after_threshold_and_fails_fast(self):
+        breaker = rf.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        func, calls = flaky(10)
+        wrapped = rf.retry_on_failure(retries=2, delay=0.001, jitter=False,
+                                      breaker=breaker)(func)
+        with self.assertRaises(sqlite3.OperationalError):
+            wrapped()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(rf.CircuitOpenError):
+            wrapped()
+        self.assertEqual(len(calls), 2)
+
+    def test_half_open_trial_closes_on_success(self):
+        breaker = rf.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, "half-open")
+        breaker.before_call()
+        with self.assertRaises(rf.CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        breaker = rf.CircuitBreaker(failure_threshold=5, reset_timeout=0.05)
+        for _ in range(5):
+            breaker.record_failure()
+        time.sleep(0.06)
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+    def test_cancelled_trial_frees_the_slot(self):
+        breaker = rf.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        @rf.retry_on_failure(retries=1, breaker=breaker)
+        async def slow():
+            await asyncio.sleep(10)
+
+        async def main():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(slow(), 0.01)
+
+        asyncio.run(main())
+        self.assertEqual(breaker.state, "half-open")
+        breaker.before_call()
+
+    def test_non_transient_errors_do_not_count(self):
+        breaker = rf.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        func, _ = flaky(1, sqlite3.IntegrityError("UNIQUE"))
+        wrapped = rf.retry_on_failure(retries=3, delay=0.001,
+                                      breaker=breaker)(func)
+        with self.assertRaises(sqlite3.IntegrityError):
+            wrapped()
+        self.assertEqual(breaker.state, "closed")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Unit tests for 2-transactional.py.
+
+The numbered modules run their demo on import, so every test module works
+in a throwaway directory holding its own users.db.
+"""
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+_cwd = os.getcwd()
+_tmp = None
+tx = None
+
+
+def make_users_db(path):
+    '''Creates a users table with two rows'''
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users "
+                 "(id INTEGER PRIMARY KEY, name TEXT, email TEXT UNIQUE)")
+    conn.executemany("INSERT INTO users (name, email) VALUES (?, ?)",
+                     [("Alice", "alice@example.com"),
+                      ("Bob", "bob@example.com")])
+    conn.commit()
+    conn.close()
+
+
+def count_users(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def setUpModule():
+    global _tmp, tx
+    _tmp = tempfile.mkdtemp()
+    os.chdir(_tmp)
+    make_users_db("users.db")
+    tx = __import__('2-transactional')
+
+
+def tearDownModule():
+    os.chdir(_cwd)
+    shutil.rmtree(_tmp)
+
+
+class TestNestedTransactional(unittest.TestCase):
+    '''Nested @transactional calls on one connection'''
+    def setUp(self):
+        self.path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(self.path)
+        self.conn = sqlite3.connect(self.path)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_outer_failure_rolls_back_inner_writes(self):
+        '''An inner call that ran before any outer DML is still undone'''
+        @tx.transactional
+        def add(conn):
+            conn.execute("INSERT INTO users (name, email) VALUES (?, ?)",
+                         ("Carol", "carol@example.com"))
+
+        @tx.transactional
+        def fail(conn):
+            raise ValueError("boom")
+
+        @tx.transactional
+        def outer(conn):
+            add(conn)
+            fail(conn)
+
+        with self.assertRaises(ValueError):
+            outer(self.conn)
+        self.assertEqual(count_users(self.path), 2)
+
+    def test_inner_failure_only_undoes_its_own_part(self):
+        '''The outer call can catch an inner failure and still commit'''
+        @tx.transactional
+        def add(conn, email):
+            conn.execute("INSERT INTO users (name, email) VALUES (?, ?)",
+                         ("X", email))
+
+        @tx.transactional
+        def outer(conn):
+            add(conn, "carol@example.com")
+            try:
+                add(conn, "alice@example.com")
+            except sqlite3.IntegrityError:
+                pass
+
+        outer(self.conn)
+        self.assertEqual(count_users(self.path), 3)
+
+    def test_nested_calls_commit_once(self):
+        '''Nothing is visible to other connections before the outer commit'''
+        seen = []
+
+        @tx.transactional
+        def add(conn, email):
+            conn.execute("INSERT INTO users (name, email) VALUES (?, ?)",
+                         ("X", email))
+            seen.append(count_users(self.path))
+
+        @tx.transactional
+        def outer(conn):
+            add(conn, "carol@example.com")
+            add(conn, "dave@example.com")
+
+        outer(self.conn)
+        self.assertEqual(seen, [2, 2])
+        self.assertEqual(count_users(self.path), 4)
+
+
+class FakeAsyncConnection:
+    '''Logs the statements an async @transactional sends'''
+    def __init__(self):
+        self.log = []
+        self.in_transaction = False
+
+    async def execute(self, sql, *args):
+        await asyncio.sleep(0)
+        self.log.append(sql)
+        if sql == "BEGIN":
+            self.in_transaction = True
+
+    async def commit(self):
+        self.log.append("COMMIT")
+        self.in_transaction = False
+
+    async def rollback(self):
+        self.log.append("ROLLBACK")
+        self.in_transaction = False
+
+    async def set_trace_callback(self, callback):
+        pass
+
+
+class TestAsyncCancellation(unittest.TestCase):
+    '''A cancelled async transaction is rolled back, not left open'''
+    def test_cancelled_transaction_is_rolled_back(self):
+        conn = FakeAsyncConnection()
+
+        @tx.transactional
+        async def slow(conn):
+            await conn.execute("UPDATE users SET name = 'partial'")
+            await asyncio.sleep(10)
+
+        @tx.transactional
+        async def quick(conn):
+            await conn.execute("UPDATE users SET name = 'x'")
+
+        async def main():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(slow(conn), 0.01)
+            await quick(conn)
+
+        asyncio.run(main())
+        self.assertEqual(conn.log, [
+            "BEGIN", "UPDATE users SET name = 'partial'", "ROLLBACK",
+            "BEGIN", "UPDATE users SET name = 'x'", "COMMIT"])
+
+    def test_cancelled_savepoint_is_rolled_back_and_released(self):
+        conn = FakeAsyncConnection()
+
+        @tx.transactional
+        async def inner(conn):
+            await conn.execute("UPDATE users SET name = 'partial'")
+            await asyncio.sleep(10)
+
+        @tx.transactional
+        async def outer(conn):
+            await inner(conn)
+
+        async def main():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(outer(conn), 0.01)
+
+        asyncio.run(main())
+        self.assertEqual(conn.log, [
+            "BEGIN", "SAVEPOINT tx_1", "UPDATE users SET name = 'partial'",
+            "ROLLBACK TO tx_1", "RELEASE tx_1", "ROLLBACK"])
+
+
+@unittest.skipIf(aiosqlite is None, "aiosqlite is not installed")
+class TestAsyncTransactional(unittest.TestCase):
+    '''Concurrent tasks on one aiosqlite connection are not nested'''
+    def test_concurrent_tasks_each_run_at_the_top_level(self):
+        path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(path)
+        depths = {}
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        def depth(conn):
+            return (tx._tx_depth.get() or {}).get(id(conn))
+
+        @tx.transactional
+        async def slow(conn):
+            depths["a"] = depth(conn)
+            started.set()
+            await release.wait()
+
+        @tx.transactional
+        async def fast(conn):
+            depths["b"] = depth(conn)
+
+        async def main():
+            async with aiosqlite.connect(path) as conn:
+                task = asyncio.create_task(slow(conn))
+                await started.wait()
+                await fast(conn)
+                release.set()
+                await task
+                depths["after"] = depth(conn)
+
+        asyncio.run(main())
+        self.assertEqual(depths, {"a": 1, "b": 1, "after": None})
+
+
+class TestGroupCommit(unittest.TestCase):
+    '''GroupCommit shares one transaction between concurrent writers'''
+    def setUp(self):
+        self.path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(self.path)
+
+    def add(self, conn, email):
+        conn.execute("INSERT INTO users (name, email) VALUES (?, ?)",
+                     ("X", email))
+
+    def test_writes_stay_uncommitted_until_the_leader_commits(self):
+        group = tx.GroupCommit(self.path, window=0.3)
+        writer = threading.Thread(
+            target=group.run, args=(self.add, "carol@example.com"))
+        writer.start()
+        time.sleep(0.1)
+        self.assertTrue(group.conn.in_transaction)
+        self.assertEqual(count_users(self.path), 2)
+        writer.join()
+        self.assertEqual(count_users(self.path), 3)
+        self.assertEqual(group.commits, 1)
+
+    def test_concurrent_writers_share_commits(self):
+        group = tx.GroupCommit(self.path, window=0.05)
+        barrier = threading.Barrier(8)
+
+        def write(i):
+            barrier.wait()
+            group.run(self.add, f"user{i}@example.com")
+
+        threads = [threading.Thread(target=write, args=(i,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(group.writes, 8)
+        self.assertLess(group.commits, 8)
+        self.assertEqual(count_users(self.path), 10)
+
+    def test_failed_writer_does_not_undo_the_others(self):
+        group = tx.GroupCommit(self.path, window=0.01)
+        group.run(self.add, "carol@example.com")
+        with self.assertRaises(sqlite3.IntegrityError):
+            group.run(self.add, "carol@example.com")
+        self.assertEqual(count_users(self.path), 3)
+
+
+class BadParams:
+    '''Parameters that make executemany raise something not from sqlite3'''
+    def __len__(self):
+        raise ValueError("bad params")
+
+    def __getitem__(self, index):
+        raise ValueError("bad params")
+
+
+class RecordingConnection:
+    '''Counts commits and checks a transaction is open after each RELEASE'''
+    def __init__(self, conn):
+        self._conn = conn
+        self.commits = 0
+        self.open_after_release = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, sql, *args):
+        cursor = self._conn.execute(sql, *args)
+        if sql.startswith("RELEASE"):
+            self.open_after_release.append(self._conn.in_transaction)
+        return cursor
+
+    def commit(self):
+        self.commits += 1
+        self._conn.commit()
+
+
+class TestWriteCoalescer(unittest.TestCase):
+    '''WriteCoalescer batches rows and resolves every caller's Future'''
+    sql = "INSERT INTO users (name, email) VALUES (?, ?)"
+
+    def setUp(self):
+        self.path = os.path.join(_tmp, f"{self.id()}.db")
+        make_users_db(self.path)
+
+    def test_failed_row_only_fails_its_own_future(self):
+        coalescer = tx.WriteCoalescer(self.sql, self.path, window=0.05)
+        futures = [coalescer.submit(("X", email)) for email in
+                   ("carol@example.com", "alice@example.com", "dave@example.com")]
+        coalescer.close()
+        self.assertIsNone(futures[0].result(timeout=5))
+        with self.assertRaises(sqlite3.IntegrityError):
+            futures[1].result(timeout=5)
+        self.assertIsNone(futures[2].result(timeout=5))
+        self.assertEqual(coalescer.batches, 1)
+        self.assertEqual(count_users(self.path), 4)
+
+    def test_rows_are_retried_in_one_transaction(self):
+        coalescer = tx.WriteCoalescer(self.sql, self.path)
+        conn = RecordingConnection(sqlite3.connect(self.path))
+        outcomes = coalescer._write_each(
+            conn, [("X", "carol@example.com"), ("X", "dave@example.com")])
+        conn.close()
+        self.assertEqual(outcomes, [None, None])
+        self.assertEqual(conn.commits, 1)
+        self.assertEqual(conn.open_after_release, [True, True])
+        self.assertEqual(count_users(self.path), 4)
+
+    def test_connect_failure_fails_pending_futures(self):
+        path = os.path.join(_tmp, "missing", "users.db")
+        coalescer = tx.WriteCoalescer(self.sql, path, window=0.01)
+        future = coalescer.submit(("X", "carol@example.com"))
+        with self.assertRaises(sqlite3.OperationalError):
+            future.result(timeout=5)
+
+    def test_unexpected_error_fails_batch_and_worker_restarts(self):
+        coalescer = tx.WriteCoalescer(self.sql, self.path, window=0.01)
+        future = coalescer.submit(BadParams())
+        with self.assertRaises(ValueError):
+            future.result(timeout=5)
+        later = coalescer.submit(("X", "carol@example.com"))
+        self.assertIsNone(later.result(timeout=5))
+        coalescer.close()
+        self.assertEqual(count_users(self.path), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
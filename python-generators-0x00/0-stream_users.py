@@ -1,12 +1,98 @@
-import seed
-
-
-def stream_users():
-    connection = seed.connect_to_prodev()
-    if connection:
-        cursor = connection.cursor()
-        cursor.execute(f"SELECT * FROM user_data;")
-        rows = cursor.fetchall()
-        for row in rows:
-            yield row
-        cursor.close()
\ No newline at end of file
+import collections
+import functools
+
+import pool
+
+USER_COLUMNS = ("user_id", "name", "email", "age")
+# age is DECIMAL(3,0); casting on the server returns a plain int (SIGNED,
+# since DECIMAL(3,0) allows negative values and UNSIGNED would wrap them)
+_SELECT_EXPRESSIONS = {"age": "CAST(age AS SIGNED) AS age"}
+
+
+def stream_users(chunk_size=1000):
+    """
+    Generator that streams rows from the user_data table one by one.
+
+    The cursor is unbuffered, so MySQL sends the result set as it is read
+    and at most `chunk_size` rows are held in memory at a time. If the
+    consumer stops early (e.g. islice), the pooled connection is discarded
+    instead of draining the rest of the table.
+    """
+    with pool.connection() as connection:
+        if not connection:
+            return
+        cursor = connection.cursor(buffered=False)
+        cursor.execute("SELECT * FROM user_data;")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+        cursor.close()
+
+
+class SlotsRecord:
+    """
+    Base for compact per-projection records, see record_type().
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__))
+
+
+@functools.lru_cache(maxsize=None)
+def record_type(columns, kind="namedtuple"):
+    """
+    Returns the record class for a projection: a NamedTuple or a
+    __slots__ class with exactly the requested columns.
+    """
+    if kind == "namedtuple":
+        return collections.namedtuple("User", columns)
+    if kind == "slots":
+        return type("UserRecord", (SlotsRecord,), {"__slots__": columns})
+    raise ValueError(f"Unknown record kind: {kind}")
+
+
+def stream_users_projected(columns=USER_COLUMNS, kind="namedtuple",
+                           chunk_size=1000):
+    """
+    Generator that streams only the requested user_data columns, decoded
+    into NamedTuples (kind="namedtuple") or __slots__ records
+    (kind="slots"), with age as a native int.
+    """
+    columns = tuple(columns)
+    unknown = set(columns) - set(USER_COLUMNS)
+    if unknown or not columns:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    record = record_type(columns, kind)
+    select = ", ".join(_SELECT_EXPRESSIONS.get(c, c) for c in columns)
+
+    with pool.connection() as connection:
+        if not connection:
+            return
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(f"SELECT {select} FROM user_data;")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if kind == "slots":
+                for row in rows:
+                    yield record(*row)
+            else:
+                yield from map(record._make, rows)
+        cursor.close()
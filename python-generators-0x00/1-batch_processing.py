@@ -1,11 +1,30 @@
-import seed
+import queue
+import threading
+import time
 
-def stream_users_in_batches(batch_size):
+import pandas as pd
+
+import pool
+
+USER_COLUMNS = ["user_id", "name", "email", "age"]
+
+
+_DONE = object()
+
+
+def stream_users_in_batches(batch_size, prefetch=0):
     """
     Generator that yields user data in batches directly from DB.
+
+    With prefetch=N a background thread reads up to N batches ahead of the
+    consumer, so fetching the next batch overlaps with processing this one.
     """
-    connection = seed.connect_to_prodev()
-    if connection:
+    if prefetch > 0:
+        yield from _prefetched_batches(batch_size, prefetch)
+        return
+    with pool.connection() as connection:
+        if not connection:
+            return
         cursor = connection.cursor()
         cursor.execute("SELECT * FROM user_data;")
         while True:
@@ -14,17 +33,111 @@ def stream_users_in_batches(batch_size):
                 break
             yield rows
         cursor.close()
-        connection.close()
+
+
+def _prefetched_batches(batch_size, prefetch):
+    """
+    Yields batches read by a reader thread through a bounded queue.
+
+    The reader blocks while the queue is full. When the consumer stops, the
+    reader is told to stop, and it closes its generator, which discards the
+    connection.
+    """
+    buffer = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        batches = stream_users_in_batches(batch_size)
+        try:
+            for rows in batches:
+                if not put(rows):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        finally:
+            batches.close()
+        put(_DONE)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        reader.join()
 
 
 def batch_processing(batch_size):
     """
-    Processes user data in batches and prints each batch.
+    Processes user data in batches and prints users over the age of 25.
     """
+    for batch in stream_users_in_batches(batch_size):
+        for user in batch:
+            if user[3] > 25:
+                print(user)
+
 
-    results = []
+def stream_columnar_batches(batch_size):
+    """
+    Generator that yields each fetched batch as a pandas DataFrame.
+    """
     for batch in stream_users_in_batches(batch_size):
+        frame = pd.DataFrame.from_records(batch, columns=USER_COLUMNS)
+        frame["age"] = frame["age"].astype("int64")
+        yield frame
+
+
+def filter_batches(batch_size, min_age=25):
+    """
+    Generator that yields, per batch, the users older than `min_age`.
+
+    The age check runs on the whole column at once instead of row by row,
+    and nothing is accumulated between batches.
+    """
+    for frame in stream_columnar_batches(batch_size):
+        selected = frame[frame["age"].to_numpy() > min_age]
+        if not selected.empty:
+            yield selected
+
+
+def benchmark_batch_processing(batch_size, min_age=25):
+    """
+    Compares rows/sec of the per-row loop against the vectorized filter.
+    """
+    results = {}
+
+    start = time.perf_counter()
+    rows = 0
+    for batch in stream_users_in_batches(batch_size):
+        rows += len(batch)
         for user in batch:
-            if user.age > 25:
-                results.append(user)
-    return results
\ No newline at end of file
+            if user[3] > min_age:
+                pass
+    elapsed = time.perf_counter() - start
+    results["per_row"] = rows / elapsed if elapsed else 0.0
+
+    start = time.perf_counter()
+    rows = 0
+    for frame in stream_columnar_batches(batch_size):
+        rows += len(frame)
+        frame[frame["age"].to_numpy() > min_age]
+    elapsed = time.perf_counter() - start
+    results["vectorized"] = rows / elapsed if elapsed else 0.0
+
+    return results
@@ -1,20 +1,37 @@
-seed = __import__('seed')
+import base64
+import json
+
+pool = __import__('pool')
+
+
+PAGE_QUERY = "SELECT * FROM user_data LIMIT %s OFFSET %s"
 
 
 def paginate_users(page_size, offset):
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
-    connection.close()
+    with pool.connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(PAGE_QUERY, (page_size, offset))
+        rows = cursor.fetchall()
+        cursor.close()
     return rows
 
 
+def _fetch_dicts(cursor):
+    # prepared cursors return tuples, build the same dicts paginate_users does
+    columns = cursor.column_names
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-def lazy_paginate(page_size):
+
+def lazy_paginate(page_size, prepared=False):
     """
     Generator function that yields user data in pages of a specified size.
+
+    With prepared=True the page query is prepared once on a single
+    connection and re-executed with bound parameters for every page.
     """
+    if prepared:
+        yield from _lazy_paginate_prepared(page_size)
+        return
     offset = 0
     while True:
         page = paginate_users(page_size, offset)
@@ -24,4 +41,87 @@ def lazy_paginate(page_size):
         offset += page_size
 
 
+def _lazy_paginate_prepared(page_size):
+    with pool.connection() as connection:
+        if not connection:
+            return
+        cursor = connection.cursor(prepared=True)
+        offset = 0
+        while True:
+            cursor.execute(PAGE_QUERY, (page_size, offset))
+            page = _fetch_dicts(cursor)
+            if not page:
+                break
+            yield page
+            offset += page_size
+        cursor.close()
+
+
+# unique indexed columns that are safe to seek on
+KEYSET_COLUMNS = ("user_id", "email")
+
+
+def encode_token(column, last_key):
+    """
+    Encodes the last key seen into an opaque continuation token.
+    """
+    payload = json.dumps({"column": column, "last": last_key})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_token(token):
+    """
+    Decodes a continuation token back into (column, last_key).
+    """
+    payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+    return payload["column"], payload["last"]
+
+
+def keyset_paginate(page_size, column="user_id", token=None, prepared=False):
+    """
+    Generator that yields (page, token) pairs using keyset (seek) pagination.
+
+    Each page starts right after the last key of the previous one, so the
+    server seeks on the index instead of skipping OFFSET rows, and a single
+    connection is reused for the whole iteration. Passing a token returned
+    earlier resumes the iteration after that page. With prepared=True both
+    page queries are prepared once and re-executed with bound parameters.
+    """
+    if column not in KEYSET_COLUMNS:
+        raise ValueError(f"Cannot paginate on column: {column}")
+
+    last_key = None
+    if token is not None:
+        token_column, last_key = decode_token(token)
+        if token_column != column:
+            raise ValueError("Token was issued for a different column")
+
+    first_query = f"SELECT * FROM user_data ORDER BY {column} LIMIT %s"
+    next_query = (
+        f"SELECT * FROM user_data WHERE {column} > %s "
+        f"ORDER BY {column} LIMIT %s"
+    )
 
+    with pool.connection() as connection:
+        if not connection:
+            return
+        if prepared:
+            # one prepared cursor per statement, so neither is re-prepared
+            first_cursor = connection.cursor(prepared=True)
+            next_cursor = connection.cursor(prepared=True)
+        else:
+            first_cursor = next_cursor = connection.cursor(dictionary=True)
+        while True:
+            if last_key is None:
+                cursor = first_cursor
+                cursor.execute(first_query, (page_size,))
+            else:
+                cursor = next_cursor
+                cursor.execute(next_query, (last_key, page_size))
+            page = _fetch_dicts(cursor) if prepared else cursor.fetchall()
+            if not page:
+                break
+            last_key = page[-1][column]
+            yield page, encode_token(column, last_key)
+        first_cursor.close()
+        next_cursor.close()
@@ -1,17 +1,21 @@
+import math
+
+
 def stream_user_ages():
     """
     Generator that yields ages of users from the user_data table.
     """
-    import seed
+    import pool
 
-    connection = seed.connect_to_prodev()
-    if connection:
+    with pool.connection() as connection:
+        if not connection:
+            return
         cursor = connection.cursor()
         cursor.execute("SELECT age FROM user_data;")
         for (age,) in cursor:
             yield age
         cursor.close()
-        connection.close()
+
 
 def average_age():
     """
@@ -22,5 +26,130 @@ def average_age():
     for age in stream_user_ages():
         total_age += age
         count += 1
-        average_age = total_age / count if count > 0 else 0
-    return f"Average age of users: {average_age}"
\ No newline at end of file
+    average_age = total_age / count if count > 0 else 0
+    return f"Average age of users: {average_age}"
+
+
+class RunningStats:
+    """
+    Single-pass, numerically stable statistics over a stream of ages.
+
+    Mean and variance use Welford's update. Ages are DECIMAL(3,0), so they
+    are whole numbers in [-999, 999] and a counting histogram gives exact
+    percentiles in constant memory. Anything outside that range raises
+    ValueError.
+    """
+
+    MAX_AGE = 999
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        # bucket i counts age i - MAX_AGE
+        self._histogram = [0] * (2 * self.MAX_AGE + 1)
+
+    def add(self, age):
+        age = int(age)
+        if not -self.MAX_AGE <= age <= self.MAX_AGE:
+            raise ValueError(f"age {age} is outside DECIMAL(3,0)")
+        self.count += 1
+        delta = age - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (age - self.mean)
+        if self.min is None or age < self.min:
+            self.min = age
+        if self.max is None or age > self.max:
+            self.max = age
+        self._histogram[age + self.MAX_AGE] += 1
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def percentile(self, p):
+        """
+        Nearest-rank percentile, p in [0, 100].
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index, hits in enumerate(self._histogram):
+            seen += hits
+            if seen >= rank:
+                return index - self.MAX_AGE
+        return self.max
+
+
+def stream_age_stats(percentiles=(50,)):
+    """
+    Computes age statistics in one pass over stream_user_ages().
+    """
+    stats = RunningStats()
+    for age in stream_user_ages():
+        stats.add(age)
+    return {
+        "count": stats.count,
+        "avg": stats.mean if stats.count else None,
+        "min": stats.min,
+        "max": stats.max,
+        "percentiles": {p: stats.percentile(p) for p in percentiles},
+    }
+
+
+def _stats_from_counts(counts, percentiles):
+    """
+    Builds the statistics dict from (age, count) pairs sorted by age,
+    answering every nearest-rank percentile in a single pass.
+    """
+    total = sum(hits for _, hits in counts)
+    result = {
+        "count": total,
+        "avg": None,
+        "min": counts[0][0] if counts else None,
+        "max": counts[-1][0] if counts else None,
+        "percentiles": {p: None for p in percentiles},
+    }
+    if not total:
+        return result
+    ranks = sorted((max(1, math.ceil(p / 100 * total)), p)
+                   for p in percentiles)
+    age_sum = 0
+    seen = 0
+    for age, hits in counts:
+        age_sum += age * hits
+        seen += hits
+        while ranks and ranks[0][0] <= seen:
+            result["percentiles"][ranks.pop(0)[1]] = age
+    result["avg"] = float(age_sum) / total
+    return result
+
+
+def aggregate_ages(percentiles=(50,), push_down=True):
+    """
+    Computes age statistics inside MySQL so only the results cross the wire.
+
+    One GROUP BY query returns a row per distinct age (at most 1999 for a
+    DECIMAL(3,0) column); count, average, min, max and every nearest-rank
+    percentile are worked out from those rows in one pass. With
+    push_down=False the statistics are computed by stream_age_stats()
+    instead.
+    """
+    import pool
+
+    if not push_down:
+        return stream_age_stats(percentiles)
+    with pool.connection() as connection:
+        if not connection:
+            return None
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT age, COUNT(*) FROM user_data WHERE age IS NOT NULL "
+            "GROUP BY age ORDER BY age;"
+        )
+        counts = cursor.fetchall()
+        cursor.close()
+    return _stats_from_counts(counts, percentiles)
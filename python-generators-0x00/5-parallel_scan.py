@@ -0,0 +1,174 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pool
+
+stream_users = __import__('0-stream_users').stream_users
+
+# columns a scan can be partitioned on
+NUMERIC_COLUMNS = ("age",)
+_DONE = object()
+
+
+class _Cancelled(Exception):
+    """Raised in a worker when the consumer has stopped reading."""
+
+
+def uuid_ranges(partitions):
+    """
+    Splits the user_id keyspace into `partitions` [low, high) ranges.
+
+    user_id holds lowercase hex UUIDs, so the first four hex digits are
+    split evenly. None marks an open bound.
+    """
+    bounds = [format(i * 0x10000 // partitions, "04x")
+              for i in range(1, partitions)]
+    lows = [None] + bounds
+    highs = bounds + [None]
+    return list(zip(lows, highs))
+
+
+def numeric_ranges(column, partitions):
+    """
+    Splits a numeric column into `partitions` [low, high) ranges using its
+    current MIN and MAX.
+    """
+    if column not in NUMERIC_COLUMNS:
+        raise ValueError(f"Cannot partition on column: {column}")
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT MIN({column}), MAX({column}) FROM user_data;")
+        low, high = cursor.fetchone()
+        cursor.close()
+    if low is None:
+        return []
+    low, high = int(low), int(high) + 1
+    step = max(1, -(-(high - low) // partitions))
+    edges = list(range(low, high, step)) + [high]
+    ranges = list(zip(edges[:-1], edges[1:]))
+    # leave the ends open so rows added since MIN/MAX are not missed
+    ranges[0] = (None, ranges[0][1])
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def _range_query(column, low, high):
+    conditions = []
+    params = []
+    if low is not None:
+        conditions.append(f"{column} >= %s")
+        params.append(low)
+    if high is not None:
+        conditions.append(f"{column} < %s")
+        params.append(high)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT * FROM user_data{where} ORDER BY {column}", params
+
+
+def _scan_partition(column, low, high, batch_size, out, stop):
+    """
+    Streams one key range into `out` as batches, then puts _DONE.
+    """
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    query, params = _range_query(column, low, high)
+    try:
+        with pool.connection() as connection:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if not put(rows):
+                    # consumer is gone, drop the connection with rows unread
+                    raise _Cancelled
+            cursor.close()
+    except _Cancelled:
+        return
+    except Exception as e:
+        put(e)
+        return
+    put(_DONE)
+
+
+def parallel_scan(partitions=4, column="user_id", ordered=False,
+                  batch_size=1000, queue_size=4):
+    """
+    Generator that scans user_data over several pooled connections at once.
+
+    The table is split into `partitions` key ranges on `column` (user_id or
+    a numeric column) and each range is read by its own worker thread. With
+    ordered=True rows come out sorted by `column`, otherwise in whatever
+    order the partitions deliver them. Each worker buffers at most
+    `queue_size` batches ahead of the consumer.
+    """
+    if column == "user_id":
+        ranges = uuid_ranges(partitions)
+    else:
+        ranges = numeric_ranges(column, partitions)
+    if not ranges:
+        return
+
+    stop = threading.Event()
+    if ordered:
+        queues = [queue.Queue(maxsize=queue_size) for _ in ranges]
+    else:
+        shared = queue.Queue(maxsize=queue_size * len(ranges))
+        queues = [shared] * len(ranges)
+
+    executor = ThreadPoolExecutor(max_workers=len(ranges))
+    try:
+        for (low, high), out in zip(ranges, queues):
+            executor.submit(_scan_partition, column, low, high,
+                            batch_size, out, stop)
+
+        if ordered:
+            for out in queues:
+                while True:
+                    item = out.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield from item
+        else:
+            remaining = len(ranges)
+            while remaining:
+                item = shared.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                yield from item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def benchmark_parallel_scan(partition_counts=(1, 2, 4, 8), batch_size=1000):
+    """
+    Compares rows/sec of stream_users against parallel_scan at several
+    partition counts.
+    """
+    def rate(rows):
+        start = time.perf_counter()
+        count = sum(1 for _ in rows)
+        elapsed = time.perf_counter() - start
+        return count / elapsed if elapsed else 0.0
+
+    results = {"stream_users": rate(stream_users(batch_size))}
+    for partitions in partition_counts:
+        results[f"parallel_scan[{partitions}]"] = rate(
+            parallel_scan(partitions, batch_size=batch_size))
+    return results
@@ -0,0 +1,143 @@
+import asyncio
+from contextlib import aclosing
+
+import aiomysql
+
+import seed
+
+_DONE = object()
+
+
+async def connect_to_prodev_async():
+    """
+    Opens an aiomysql connection to ALX_prodev using seed's settings.
+    """
+    return await aiomysql.connect(
+        host=seed.DB_HOST,
+        user=seed.DB_USER,
+        password=seed.DB_PASSWORD,
+        db=seed.DB_NAME,
+    )
+
+
+async def _prefetch(source, prefetch):
+    """
+    Runs the async generator `source` in a background task that keeps up
+    to `prefetch` items ready, so fetching overlaps with the consumer.
+    """
+    buffer = asyncio.Queue(maxsize=prefetch)
+
+    async def fill():
+        try:
+            async for item in source:
+                await buffer.put(item)
+        except Exception as e:
+            await buffer.put(e)
+            return
+        await buffer.put(_DONE)
+
+    task = asyncio.create_task(fill())
+    try:
+        while True:
+            item = await buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await source.aclose()
+
+
+async def _fetch_batches(query, batch_size, cursor_class=aiomysql.SSCursor):
+    """
+    Streams `query` through a server-side cursor in batches.
+    """
+    connection = await connect_to_prodev_async()
+    try:
+        # no `async with` on the cursor: SSCursor.close() reads the rest of
+        # the result set, which is what an early exit must not do
+        cursor = await connection.cursor(cursor_class)
+        await cursor.execute(query)
+        while True:
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        await cursor.close()
+    finally:
+        # close() drops the socket at once, even with rows left unread
+        connection.close()
+
+
+async def _fetch_pages(page_size):
+    """
+    Keyset-paginates user_data on user_id over a single connection.
+    """
+    connection = await connect_to_prodev_async()
+    try:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            last_id = None
+            while True:
+                if last_id is None:
+                    await cursor.execute(
+                        "SELECT * FROM user_data ORDER BY user_id LIMIT %s",
+                        (page_size,))
+                else:
+                    await cursor.execute(
+                        "SELECT * FROM user_data WHERE user_id > %s "
+                        "ORDER BY user_id LIMIT %s", (last_id, page_size))
+                page = await cursor.fetchall()
+                if not page:
+                    break
+                last_id = page[-1]["user_id"]
+                yield list(page)
+    finally:
+        connection.close()
+
+
+async def stream_users_async(chunk_size=1000, prefetch=4):
+    """
+    Async generator that yields rows from user_data one by one.
+    """
+    batches = _fetch_batches("SELECT * FROM user_data;", chunk_size)
+    async with aclosing(_prefetch(batches, prefetch)) as prefetched:
+        async for rows in prefetched:
+            for row in rows:
+                yield row
+
+
+async def stream_users_in_batches_async(batch_size, prefetch=4):
+    """
+    Async generator that yields user data in batches.
+    """
+    batches = _fetch_batches("SELECT * FROM user_data;", batch_size)
+    async with aclosing(_prefetch(batches, prefetch)) as prefetched:
+        async for rows in prefetched:
+            yield rows
+
+
+async def lazy_paginate_async(page_size, prefetch=2):
+    """
+    Async generator that yields user data in pages of a specified size.
+    """
+    pages = _fetch_pages(page_size)
+    async with aclosing(_prefetch(pages, prefetch)) as prefetched:
+        async for page in prefetched:
+            yield page
+
+
+async def stream_user_ages_async(chunk_size=1000, prefetch=4):
+    """
+    Async generator that yields ages of users from the user_data table.
+    """
+    batches = _fetch_batches("SELECT age FROM user_data;", chunk_size)
+    async with aclosing(_prefetch(batches, prefetch)) as prefetched:
+        async for rows in prefetched:
+            for (age,) in rows:
+                yield age
@@ -0,0 +1,98 @@
+import glob
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+stream_users_in_batches = __import__(
+    '1-batch_processing').stream_users_in_batches
+
+USER_SCHEMA = pa.schema([
+    ("user_id", pa.string()),
+    ("name", pa.string()),
+    ("email", pa.string()),
+    ("age", pa.int16()),
+])
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def to_record_batch(rows):
+    """
+    Converts a batch of user_data tuples into an Arrow record batch.
+    """
+    user_ids, names, emails, ages = zip(*rows)
+    return pa.record_batch([
+        pa.array(user_ids, pa.string()),
+        pa.array(names, pa.string()),
+        pa.array(emails, pa.string()),
+        pa.array([int(age) for age in ages], pa.int16()),
+    ], schema=USER_SCHEMA)
+
+
+def _open_writer(path, fmt, compression):
+    if fmt == "parquet":
+        return pq.ParquetWriter(path, USER_SCHEMA, compression=compression)
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    return pa.ipc.new_file(path, USER_SCHEMA, options=options)
+
+
+def export_users(directory, fmt="parquet", batch_size=10000,
+                 rows_per_file=1000000, compression="zstd", prefetch=2):
+    """
+    Streams user_data into compressed Parquet or Arrow IPC files.
+
+    Rows are read in batches of `batch_size` and every batch is written as
+    soon as it arrives, so memory stays bounded by one batch. A new
+    part-NNNNN file is started every `rows_per_file` rows. Returns the list
+    of files written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    writer = None
+    rows_in_file = 0
+    try:
+        for rows in stream_users_in_batches(batch_size, prefetch=prefetch):
+            if writer is None or rows_in_file >= rows_per_file:
+                if writer is not None:
+                    writer.close()
+                path = os.path.join(
+                    directory, f"part-{len(paths):05d}{FORMATS[fmt]}")
+                writer = _open_writer(path, fmt, compression)
+                paths.append(path)
+                rows_in_file = 0
+            writer.write_batch(to_record_batch(rows))
+            rows_in_file += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return paths
+
+
+def _file_batches(path, batch_size):
+    source = pa.memory_map(path, "r")
+    try:
+        if path.endswith(FORMATS["parquet"]):
+            yield from pq.ParquetFile(source).iter_batches(batch_size)
+        else:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+    finally:
+        source.close()
+
+
+def read_exported_batches(directory, batch_size=10000):
+    """
+    Generator that yields exported users in batches of tuples, like
+    stream_users_in_batches does, reading the files through memory maps.
+    """
+    paths = sorted(
+        path for ext in FORMATS.values()
+        for path in glob.glob(os.path.join(directory, f"part-*{ext}")))
+    for path in paths:
+        for batch in _file_batches(path, batch_size):
+            columns = [column.to_pylist() for column in batch.columns]
+            yield list(zip(*columns))
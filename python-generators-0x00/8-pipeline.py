@@ -0,0 +1,217 @@
+import collections
+import itertools
+import time
+
+_MAP = "map"
+_FILTER = "filter"
+
+
+class StageStats:
+    """
+    Counters for one pipeline stage.
+    """
+
+    __slots__ = ("name", "items_in", "items_out", "seconds")
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.seconds = 0.0
+
+    @property
+    def throughput(self):
+        return self.items_in / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "in": self.items_in,
+            "out": self.items_out,
+            "seconds": self.seconds,
+            "items_per_sec": self.throughput,
+        }
+
+
+def _fused(items, ops):
+    """
+    Runs a chain of map/filter ops in a single loop (one generator frame).
+    """
+    for item in items:
+        for kind, fn, _ in ops:
+            if kind is _MAP:
+                item = fn(item)
+            elif not fn(item):
+                break
+        else:
+            yield item
+
+
+def _fused_profiled(items, ops):
+    clock = time.perf_counter
+    for item in items:
+        for kind, fn, stats in ops:
+            stats.items_in += 1
+            start = clock()
+            if kind is _MAP:
+                item = fn(item)
+                keep = True
+            else:
+                keep = fn(item)
+            stats.seconds += clock() - start
+            if not keep:
+                break
+            stats.items_out += 1
+        else:
+            yield item
+
+
+def _batched(items, size):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _batched_profiled(items, size, stats):
+    # only the stage's own work is timed, not pulling items from upstream
+    clock = time.perf_counter
+    batch = []
+    for item in items:
+        start = clock()
+        batch.append(item)
+        ready = None
+        if len(batch) == size:
+            ready, batch = batch, []
+        stats.items_in += 1
+        stats.seconds += clock() - start
+        if ready is not None:
+            stats.items_out += 1
+            yield ready
+    if batch:
+        stats.items_out += 1
+        yield batch
+
+
+def _windowed(items, size, step):
+    window = collections.deque(maxlen=size)
+    pending = size
+    for item in items:
+        window.append(item)
+        pending -= 1
+        if pending == 0:
+            yield tuple(window)
+            pending = step
+
+
+def _windowed_profiled(items, size, step, stats):
+    clock = time.perf_counter
+    window = collections.deque(maxlen=size)
+    pending = size
+    for item in items:
+        start = clock()
+        window.append(item)
+        pending -= 1
+        ready = None
+        if pending == 0:
+            ready = tuple(window)
+            pending = step
+        stats.items_in += 1
+        stats.seconds += clock() - start
+        if ready is not None:
+            stats.items_out += 1
+            yield ready
+
+
+class Pipeline:
+    """
+    Composable source -> map/filter -> batch/window -> sink pipeline.
+
+    Each method returns a new Pipeline, so a partial pipeline can be reused.
+    Consecutive map and filter stages are fused into one loop instead of
+    one generator per stage. With profile=True every stage counts the items
+    going in and out and the time spent in it, see stats().
+    """
+
+    def __init__(self, source, profile=False):
+        self._source = source
+        self._stages = ()
+        self.profile = profile
+        self._stats = []
+
+    def _with(self, stage):
+        pipeline = Pipeline(self._source, self.profile)
+        pipeline._stages = self._stages + (stage,)
+        return pipeline
+
+    def map(self, fn, name=None):
+        return self._with((_MAP, fn, name or f"map:{fn.__name__}"))
+
+    def filter(self, fn, name=None):
+        return self._with((_FILTER, fn, name or f"filter:{fn.__name__}"))
+
+    def batch(self, size):
+        return self._with(("batch", size, f"batch:{size}"))
+
+    def window(self, size, step=1):
+        """
+        Sliding windows of `size` items, advancing by `step`
+        (step=size gives tumbling windows).
+        """
+        return self._with(("window", (size, step), f"window:{size}/{step}"))
+
+    def __iter__(self):
+        self._stats = []
+        items = iter(self._source)
+        ops = []
+        for kind, arg, name in self._stages:
+            stats = StageStats(name) if self.profile else None
+            if stats is not None:
+                self._stats.append(stats)
+            if kind in (_MAP, _FILTER):
+                ops.append((kind, arg, stats))
+                continue
+            items = self._flush(items, ops)
+            ops = []
+            if kind == "batch":
+                items = (_batched_profiled(items, arg, stats) if self.profile
+                         else _batched(items, arg))
+            elif self.profile:
+                items = _windowed_profiled(items, arg[0], arg[1], stats)
+            else:
+                items = _windowed(items, arg[0], arg[1])
+        return self._flush(items, ops)
+
+    def _flush(self, items, ops):
+        if not ops:
+            return items
+        if self.profile:
+            return _fused_profiled(items, tuple(ops))
+        return _fused(items, tuple(ops))
+
+    def sink(self, fn):
+        """
+        Runs the pipeline, calling `fn` on every item. Returns the count.
+        """
+        count = 0
+        for item in self:
+            fn(item)
+            count += 1
+        return count
+
+    def reduce(self, fn, initial):
+        """
+        Runs the pipeline and folds the items with fn(accumulator, item).
+        """
+        accumulator = initial
+        for item in self:
+            accumulator = fn(accumulator, item)
+        return accumulator
+
+    def stats(self):
+        """
+        Per-stage counters from the last run (profile=True only).
+        """
+        return [stats.as_dict() for stats in self._stats]
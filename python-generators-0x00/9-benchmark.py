@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the user_data generators against a local MySQL database.
+
+Seeds N synthetic users into a separate database (ALX_prodev_bench by
+default, override with PRODEV_BENCH_DB_NAME), then runs every strategy for
+every size and batch size in a fresh process and prints the results as JSON:
+
+    python3 9-benchmark.py --sizes 10000,100000 --batch-sizes 100,1000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import time
+
+import seed
+
+# seeding drops user_data, so this must never be the PRODEV_DB_NAME database;
+# set at import so the spawned case processes use it too
+BENCH_DB_NAME = os.environ.get("PRODEV_BENCH_DB_NAME", "ALX_prodev_bench")
+PRODUCTION_DB_NAME = seed.DB_NAME
+seed.DB_NAME = BENCH_DB_NAME
+
+
+def _stream_users(batch_size):
+    stream_users = __import__('0-stream_users').stream_users
+    for row in stream_users(batch_size):
+        yield 1
+
+
+def _stream_users_in_batches(batch_size):
+    batches = __import__('1-batch_processing').stream_users_in_batches
+    for rows in batches(batch_size):
+        yield len(rows)
+
+
+def _lazy_paginate(batch_size):
+    lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+    for page in lazy_paginate(batch_size):
+        yield len(page)
+
+
+def _lazy_paginate_prepared(batch_size):
+    lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+    for page in lazy_paginate(batch_size, prepared=True):
+        yield len(page)
+
+
+def _keyset_paginate(batch_size):
+    keyset_paginate = __import__('2-lazy_paginate').keyset_paginate
+    for page, _ in keyset_paginate(batch_size):
+        yield len(page)
+
+
+def _keyset_paginate_prepared(batch_size):
+    keyset_paginate = __import__('2-lazy_paginate').keyset_paginate
+    for page, _ in keyset_paginate(batch_size, prepared=True):
+        yield len(page)
+
+
+def _stream_user_ages(batch_size):
+    stream_user_ages = __import__('4-stream_ages').stream_user_ages
+    for age in stream_user_ages():
+        yield 1
+
+
+# each case yields the number of rows it produced per step
+CASES = {
+    "stream_users": _stream_users,
+    "stream_users_in_batches": _stream_users_in_batches,
+    "lazy_paginate": _lazy_paginate,
+    "lazy_paginate_prepared": _lazy_paginate_prepared,
+    "keyset_paginate": _keyset_paginate,
+    "keyset_paginate_prepared": _keyset_paginate_prepared,
+    "stream_user_ages": _stream_user_ages,
+}
+
+
+def seed_synthetic_users(size, chunk_size=10000):
+    """
+    Recreates user_data in the benchmark database with `size` users.
+    """
+    if seed.DB_NAME == PRODUCTION_DB_NAME:
+        raise RuntimeError(
+            f"Refusing to seed {seed.DB_NAME}: it is the PRODEV_DB_NAME "
+            "database. Set PRODEV_BENCH_DB_NAME to a different name.")
+    connection = seed.connect_db()
+    seed.create_database(connection)
+    connection.close()
+
+    connection = seed.connect_to_prodev()
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS user_data;")
+    seed.create_table(connection)
+    for start in range(0, size, chunk_size):
+        rows = []
+        for i in range(start, min(start + chunk_size, size)):
+            email = f"user{i}@example.com"
+            rows.append((seed.user_id_for(email), f"User {i}", email,
+                         18 + i % 80))
+        cursor.executemany("""
+            INSERT INTO user_data (user_id, name, email, age)
+            VALUES (%s, %s, %s, %s)
+        """, rows)
+        connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def _run_case(name, batch_size, results):
+    start = time.perf_counter()
+    first_row = None
+    rows = 0
+    for count in CASES[name](batch_size):
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        rows += count
+    elapsed = time.perf_counter() - start
+    results.put({
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+        "time_to_first_row": first_row,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+
+
+def run_case(name, batch_size):
+    """
+    Runs one case in a fresh process so peak RSS is measured per case.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_case,
+                              args=(name, batch_size, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(
+                    f"{name} exited with code {process.exitcode}")
+    process.join()
+    return result
+
+
+def run_benchmarks(sizes, batch_sizes, cases=tuple(CASES)):
+    report = {
+        "database": seed.DB_NAME,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [],
+    }
+    for size in sizes:
+        seed_synthetic_users(size)
+        for batch_size in batch_sizes:
+            for name in cases:
+                result = run_case(name, batch_size)
+                result.update(case=name, size=size, batch_size=batch_size)
+                report["results"].append(result)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--batch-sizes", default="100,1000")
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--output", help="write the JSON report to a file")
+    args = parser.parse_args(argv)
+    cases = [case for case in args.cases.split(",") if case]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(
+        [int(size) for size in args.sizes.split(",")],
+        [int(size) for size in args.batch_sizes.split(",")],
+        cases,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
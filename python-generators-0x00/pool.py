@@ -0,0 +1,203 @@
+import collections
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import seed
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of ALX_prodev connections.
+
+    Keeps up to `size` idle connections and allows `max_overflow` extra ones
+    under load. Idle connections older than `idle_timeout` seconds are
+    closed, and every checkout is health-checked before it is handed out.
+    """
+
+    def __init__(self, size=5, max_overflow=5, idle_timeout=300, timeout=30,
+                 connect=seed.connect_to_prodev):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._connect = connect
+        self._idle = collections.deque()
+        self._checked_out = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "discarded": 0,
+        }
+
+    def acquire(self):
+        """
+        Checks out a connection, opening one if the pool allows it.
+
+        Returns None if a new connection could not be opened, the same way
+        seed.connect_to_prodev() does. Raises TimeoutError if the pool stays
+        exhausted for longer than `timeout` seconds.
+        """
+        deadline = time.monotonic() + self.timeout
+        waited_since = None
+        limit = self.size + self.max_overflow
+        while True:
+            with self._cond:
+                while True:
+                    if self._idle:
+                        # most recently used first, so surplus connections
+                        # age out
+                        connection, last_used = self._idle.pop()
+                        break
+                    if self._checked_out < limit:
+                        connection = None
+                        self._stats["misses"] += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Connection pool exhausted")
+                    if waited_since is None:
+                        waited_since = time.monotonic()
+                        self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+                if waited_since is not None:
+                    self._stats["wait_time"] += time.monotonic() - waited_since
+                    waited_since = None
+                self._checked_out += 1
+            if connection is None:
+                break
+
+            # checked outside the lock: is_connected() is a round trip to the
+            # server and must not hold up every other checkout
+            if time.monotonic() - last_used > self.idle_timeout:
+                _close(connection)
+            elif _is_healthy(connection):
+                with self._cond:
+                    self._stats["hits"] += 1
+                return connection
+            else:
+                _close(connection, abort=True)
+                with self._cond:
+                    self._stats["discarded"] += 1
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+
+        connection = self._connect()
+        if connection is None:
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+        return connection
+
+    def release(self, connection, discard=False):
+        """
+        Returns a connection to the pool, or drops it if `discard` is set.
+
+        Discard connections that may still have unread results on the wire,
+        e.g. from a generator that was stopped early.
+        """
+        if not discard:
+            try:
+                # end the read snapshot so the next borrower sees fresh data
+                connection.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._checked_out -= 1
+            keep = not discard and len(self._idle) < self.size
+            if keep:
+                self._idle.append((connection, time.monotonic()))
+            elif discard:
+                self._stats["discarded"] += 1
+            self._cond.notify()
+        if not keep:
+            _close(connection, abort=discard)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection for the duration of a with-block.
+
+        The connection is discarded if the block exits with an exception,
+        including GeneratorExit when a generator is closed early.
+        """
+        connection = self.acquire()
+        if connection is None:
+            yield None
+            return
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def metrics(self):
+        """
+        Returns a snapshot of the pool counters.
+        """
+        with self._cond:
+            metrics = dict(self._stats)
+            metrics["idle"] = len(self._idle)
+            metrics["checked_out"] = self._checked_out
+        return metrics
+
+    def close(self):
+        """
+        Closes every idle connection.
+        """
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _ in idle:
+            _close(connection)
+
+
+def _is_healthy(connection):
+    try:
+        return connection.is_connected()
+    except Exception:
+        return False
+
+
+def _close(connection, abort=False):
+    try:
+        if abort:
+            connection.shutdown()
+        else:
+            connection.close()
+    except Exception:
+        pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the process-wide pool, configured from PRODEV_POOL_* variables.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                size=int(os.environ.get("PRODEV_POOL_SIZE", 5)),
+                max_overflow=int(os.environ.get("PRODEV_POOL_MAX_OVERFLOW", 5)),
+                idle_timeout=float(
+                    os.environ.get("PRODEV_POOL_IDLE_TIMEOUT", 300)),
+                timeout=float(os.environ.get("PRODEV_POOL_TIMEOUT", 30)),
+            )
+        return _pool
+
+
+def connection():
+    """
+    Shortcut for get_pool().connection().
+    """
+    return get_pool().connection()
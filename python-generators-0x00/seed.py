@@ -1,13 +1,28 @@
+import csv
+import hashlib
+import io
+import os
+import time
+import urllib.request
+import uuid
+from urllib.parse import urlsplit
+
 import mysql.connector
 import pandas as pd
 
+# ---------- Connection settings (override with environment variables) ----------
+DB_HOST = os.environ.get("PRODEV_DB_HOST", "localhost")
+DB_USER = os.environ.get("PRODEV_DB_USER", "root")          # 👈 adjust user
+DB_PASSWORD = os.environ.get("PRODEV_DB_PASSWORD", "sode007")  # 👈 adjust password
+DB_NAME = os.environ.get("PRODEV_DB_NAME", "ALX_prodev")
+
 # ---------- Connect to MySQL (no database yet) ----------
 def connect_db():
     try:
         connection = mysql.connector.connect(
-            host="localhost",
-            user="root",         # 👈 adjust user
-            password="sode007" # 👈 adjust password
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASSWORD
         )
         return connection
     except mysql.connector.Error as e:
@@ -18,18 +33,19 @@ def connect_db():
 # ---------- Create Database ----------
 def create_database(connection):
     cursor = connection.cursor()
-    cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev;")
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME};")
     cursor.close()
 
 
 # ---------- Connect to ALX_prodev ----------
-def connect_to_prodev():
+def connect_to_prodev(**options):
     try:
         connection = mysql.connector.connect(
-            host="localhost",
-            user="root",          # 👈 adjust user
-            password="sode007",   # 👈 adjust password
-            database="ALX_prodev"
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME,
+            **options
         )
         return connection
     except mysql.connector.Error as e:
@@ -66,3 +82,189 @@ def insert_data(connection, csv_url):
 
     connection.commit()
     cursor.close()
+
+
+# ---------- Bulk Insert Data from CSV ----------
+def insert_data_bulk(connection, csv_url, chunk_size=10000):
+    """
+    Streams the CSV in chunks and inserts each chunk with one executemany.
+
+    mysql.connector rewrites executemany on an INSERT ... VALUES statement
+    into a single multi-row INSERT, so each chunk is one round trip and one
+    commit. Returns the number of rows sent and prints rows/sec.
+    """
+    cursor = connection.cursor()
+    start = time.perf_counter()
+    total = 0
+    for chunk in pd.read_csv(csv_url, chunksize=chunk_size):
+        rows = list(zip(chunk["name"], chunk["email"], chunk["age"].tolist()))
+        cursor.executemany("""
+            INSERT IGNORE INTO user_data (user_id, name, email, age)
+            VALUES (UUID(), %s, %s, %s)
+        """, rows)
+        connection.commit()
+        total += len(rows)
+    cursor.close()
+    _report_rate(total, time.perf_counter() - start)
+    return total
+
+
+def load_data_infile(connection, csv_path):
+    """
+    Loads a local CSV file with LOAD DATA LOCAL INFILE.
+
+    The connection must be opened with allow_local_infile=True, e.g.
+    connect_to_prodev(allow_local_infile=True). Returns the number of rows
+    loaded and prints rows/sec.
+    """
+    if not os.path.isfile(csv_path):
+        raise ValueError(f"LOAD DATA needs a local file: {csv_path}")
+    cursor = connection.cursor()
+    start = time.perf_counter()
+    cursor.execute("""
+        LOAD DATA LOCAL INFILE %s
+        IGNORE INTO TABLE user_data
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        IGNORE 1 LINES
+        (name, email, age)
+        SET user_id = UUID()
+    """, (os.path.abspath(csv_path),))
+    connection.commit()
+    total = cursor.rowcount
+    cursor.close()
+    _report_rate(total, time.perf_counter() - start)
+    return total
+
+
+def _report_rate(rows, elapsed):
+    rate = rows / elapsed if elapsed else 0.0
+    print(f"Inserted {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+
+# ---------- Incremental, resumable seeding ----------
+# fixed namespace so the same email always maps to the same user_id
+USER_ID_NAMESPACE = uuid.UUID("6f1c2d2e-4b8a-5c3e-9a0d-2f7e8b1c4d5a")
+
+
+def user_id_for(email):
+    """
+    Returns a deterministic user_id for an email address.
+    """
+    return str(uuid.uuid5(USER_ID_NAMESPACE, email.strip().lower()))
+
+
+def create_manifest_table(connection):
+    cursor = connection.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS seed_manifest (
+        source VARCHAR(255) NOT NULL,
+        chunk_index INT NOT NULL,
+        chunk_hash CHAR(64) NOT NULL,
+        row_count INT NOT NULL,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (source, chunk_index)
+    );
+    """)
+    cursor.close()
+
+
+def _open_csv(csv_url):
+    if os.path.isfile(csv_url):
+        return open(csv_url, newline="", encoding="utf-8")
+    return io.TextIOWrapper(urllib.request.urlopen(csv_url), encoding="utf-8",
+                            newline="")
+
+
+def _source_key(csv_url):
+    # signed URLs change on every download, only the path identifies the file
+    parts = urlsplit(csv_url)
+    return (parts.netloc + parts.path) if parts.scheme else os.path.abspath(csv_url)
+
+
+def _content_chunks(reader, chunk_size):
+    """
+    Splits CSV rows into chunks whose boundaries depend on the rows, not on
+    their position: a chunk ends after any row whose email hashes to 0 mod
+    chunk_size (so chunks average chunk_size rows), or at 4 * chunk_size
+    rows. Inserting or deleting a row only changes the chunk it falls in;
+    every later chunk keeps its boundaries and its hash. Yields
+    (rows, chunk_hash) pairs.
+    """
+    rows = []
+    digest = hashlib.sha256()
+    for row in reader:
+        rows.append(row)
+        digest.update(
+            f"{row['name']}\x1f{row['email']}\x1f{row['age']}\n".encode())
+        cut = hashlib.sha256(row["email"].strip().lower().encode()).digest()
+        if (int.from_bytes(cut[:8], "big") % chunk_size == 0
+                or len(rows) >= 4 * chunk_size):
+            yield rows, digest.hexdigest()
+            rows = []
+            digest = hashlib.sha256()
+    if rows:
+        yield rows, digest.hexdigest()
+
+
+def insert_data_incremental(connection, csv_url, chunk_size=10000):
+    """
+    Loads the CSV chunk by chunk, skipping chunks that are already loaded.
+
+    Chunks are cut on content (see _content_chunks), hashed and recorded in
+    seed_manifest together with the rows they inserted, in the same
+    transaction. On a re-run, chunks whose hash is already in the manifest
+    are skipped, so an edit, insert or delete anywhere in the file only
+    resends the chunk around it. user_id is derived from the email, so
+    reloading a chunk updates rows in place instead of creating new ones.
+    Rows removed from the CSV are not deleted from user_data. Returns a dict
+    with the number of chunks loaded and skipped.
+    """
+    create_manifest_table(connection)
+    source = _source_key(csv_url)
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT chunk_index, chunk_hash FROM seed_manifest WHERE source = %s",
+        (source,))
+    manifest = dict(cursor.fetchall())
+    known = set(manifest.values())
+
+    loaded = skipped = rows_sent = chunks = 0
+    start = time.perf_counter()
+    with _open_csv(csv_url) as stream:
+        reader = csv.DictReader(stream)
+        for index, (chunk, chunk_hash) in enumerate(
+                _content_chunks(reader, chunk_size)):
+            chunks = index + 1
+            if chunk_hash in known:
+                skipped += 1
+                if manifest.get(index) != chunk_hash:
+                    # same rows, shifted by a change earlier in the file
+                    cursor.execute("""
+                        REPLACE INTO seed_manifest (source, chunk_index, chunk_hash, row_count)
+                        VALUES (%s, %s, %s, %s)
+                    """, (source, index, chunk_hash, len(chunk)))
+                continue
+
+            cursor.executemany("""
+                INSERT INTO user_data (user_id, name, email, age)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE name = VALUES(name), age = VALUES(age)
+            """, [(user_id_for(row["email"]), row["name"], row["email"],
+                   row["age"]) for row in chunk])
+            cursor.execute("""
+                REPLACE INTO seed_manifest (source, chunk_index, chunk_hash, row_count)
+                VALUES (%s, %s, %s, %s)
+            """, (source, index, chunk_hash, len(chunk)))
+            connection.commit()
+            loaded += 1
+            rows_sent += len(chunk)
+
+    # the file may have shrunk since the last run
+    cursor.execute(
+        "DELETE FROM seed_manifest WHERE source = %s AND chunk_index >= %s",
+        (source, chunks))
+    connection.commit()
+    cursor.close()
+    _report_rate(rows_sent, time.perf_counter() - start)
+    return {"loaded": loaded, "skipped": skipped}
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Unit tests for Pipeline in 8-pipeline.py.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pipeline = __import__('8-pipeline')
+Pipeline = pipeline.Pipeline
+
+
+def double(x):
+    return x * 2
+
+
+def is_even(x):
+    return x % 2 == 0
+
+
+class TestPipeline(unittest.TestCase):
+    '''Pipeline stages, fusion and profiling'''
+    def test_consecutive_maps_and_filters_are_fused(self):
+        source = iter(range(10))
+        items = iter(Pipeline(source).map(double).filter(is_even)
+                     .map(str).filter(bool))
+        # one generator frame reading straight from the source
+        self.assertIs(items.gi_code, pipeline._fused.__code__)
+        self.assertIs(items.gi_frame.f_locals["items"], source)
+        self.assertEqual(len(items.gi_frame.f_locals["ops"]), 4)
+        self.assertEqual(list(items), [str(x * 2) for x in range(10)])
+
+    def test_trailing_partial_batch(self):
+        self.assertEqual(list(Pipeline(range(7)).batch(3)),
+                         [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(Pipeline(range(7), profile=True).batch(3)),
+                         [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_window_and_step(self):
+        for profile in (False, True):
+            source = Pipeline(range(6), profile=profile)
+            self.assertEqual(list(source.window(2, 4)), [(0, 1), (4, 5)])
+            self.assertEqual(list(source.window(3)),
+                             [(0, 1, 2), (1, 2, 3), (2, 3, 4), (3, 4, 5)])
+            self.assertEqual(list(source.window(2, 2)),
+                             [(0, 1), (2, 3), (4, 5)])
+
+    def test_profile_counters(self):
+        p = (Pipeline(range(10), profile=True)
+             .filter(is_even).map(double).batch(2).window(2))
+        self.assertEqual(list(p), [([0, 4], [8, 12]), ([8, 12], [16])])
+        counts = [(s["stage"], s["in"], s["out"]) for s in p.stats()]
+        self.assertEqual(counts, [
+            ("filter:is_even", 10, 5),
+            ("map:double", 5, 5),
+            ("batch:2", 5, 3),
+            ("window:2/1", 3, 2),
+        ])
+        for stage in p.stats():
+            self.assertGreater(stage["seconds"], 0)
+            self.assertGreater(stage["items_per_sec"], 0)
+
+    def test_reduce_and_sink(self):
+        p = Pipeline(range(5)).map(double)
+        self.assertEqual(p.reduce(lambda total, x: total + x, 0), 20)
+        seen = []
+        self.assertEqual(p.sink(seen.append), 5)
+        self.assertEqual(seen, [0, 2, 4, 6, 8])
+
+
+if __name__ == '__main__':
+    unittest.main()
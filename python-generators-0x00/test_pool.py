@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Unit tests for pool.py.
+
+The pool is given fake connections through its `connect` argument, so no
+MySQL server is needed.
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pool import ConnectionPool  # noqa: E402
+
+
+class FakeConnection:
+    '''Just enough of a mysql.connector connection for the pool'''
+    def __init__(self, healthy=True, check=None):
+        self.healthy = healthy
+        self.check = check
+        self.closed = False
+        self.aborted = False
+
+    def is_connected(self):
+        if self.check is not None:
+            self.check()
+        return self.healthy
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def shutdown(self):
+        self.aborted = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    '''ConnectionPool checkout, health checks and limits'''
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            connection = FakeConnection()
+            self.opened.append(connection)
+            return connection
+        return ConnectionPool(connect=connect, **kwargs)
+
+    def test_released_connection_is_reused(self):
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        metrics = pool.metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"]), (1, 1))
+
+    def test_unhealthy_idle_connection_is_replaced(self):
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        first.healthy = False
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.aborted)
+        self.assertEqual(pool.metrics()["discarded"], 1)
+        self.assertEqual(pool.metrics()["checked_out"], 1)
+
+    def test_expired_idle_connection_is_closed(self):
+        pool = self.make_pool(idle_timeout=0)
+        first = pool.acquire()
+        pool.release(first)
+        time.sleep(0.01)
+        self.assertIsNot(pool.acquire(), first)
+        self.assertTrue(first.closed)
+
+    def test_health_check_does_not_block_other_checkouts(self):
+        pool = self.make_pool(size=2, max_overflow=0, timeout=5)
+        checking = threading.Event()
+        finish = threading.Event()
+
+        def slow_check():
+            checking.set()
+            finish.wait(5)
+
+        idle = pool.acquire()
+        pool.release(idle)
+        idle.check = slow_check
+        borrower = threading.Thread(target=pool.acquire)
+        borrower.start()
+        self.assertTrue(checking.wait(5))
+        start = time.monotonic()
+        other = pool.acquire()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertIsNot(other, idle)
+        finish.set()
+        borrower.join()
+        self.assertEqual(pool.metrics()["checked_out"], 2)
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.make_pool(size=1, max_overflow=0, timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(TimeoutError):
+            pool.acquire()
+        self.assertEqual(pool.metrics()["waits"], 1)
+
+    def test_connection_is_discarded_on_error(self):
+        pool = self.make_pool()
+        with self.assertRaises(ValueError):
+            with pool.connection() as connection:
+                raise ValueError("boom")
+        self.assertTrue(connection.aborted)
+        self.assertEqual(pool.metrics()["idle"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
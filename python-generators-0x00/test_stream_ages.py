@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Unit tests for RunningStats and the aggregate helpers in 4-stream_ages.py.
+"""
+import collections
+import os
+import statistics
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+stream_ages = __import__('4-stream_ages')
+RunningStats = stream_ages.RunningStats
+
+
+class TestRunningStats(unittest.TestCase):
+    '''RunningStats against the statistics module'''
+    def stats_for(self, ages):
+        stats = RunningStats()
+        for age in ages:
+            stats.add(age)
+        return stats
+
+    def test_matches_statistics_module(self):
+        ages = [23, 41, 18, 67, 35, 35, 90, 52]
+        stats = self.stats_for(ages)
+        self.assertAlmostEqual(stats.mean, statistics.mean(ages))
+        self.assertAlmostEqual(stats.variance, statistics.variance(ages))
+        self.assertEqual((stats.min, stats.max), (18, 90))
+        self.assertEqual(stats.percentile(50), 35)
+        self.assertEqual(stats.percentile(100), 90)
+
+    def test_negative_ages_keep_their_place(self):
+        stats = self.stats_for([-5, 10, 20])
+        self.assertEqual(stats.percentile(0), -5)
+        self.assertEqual(stats.percentile(34), 10)
+        self.assertEqual(stats.min, -5)
+
+    def test_range_limits(self):
+        stats = self.stats_for([-999, 999])
+        self.assertEqual(stats.percentile(50), -999)
+        self.assertEqual(stats.percentile(100), 999)
+        for age in (-1000, 1000):
+            with self.assertRaises(ValueError):
+                stats.add(age)
+        self.assertEqual(stats.count, 2)
+
+    def test_empty(self):
+        self.assertIsNone(RunningStats().percentile(50))
+
+
+class TestStatsFromCounts(unittest.TestCase):
+    '''GROUP BY rows give the same answers as streaming every age'''
+    def test_matches_running_stats(self):
+        ages = [23, 41, 18, 67, 35, 35, 90, 52, -5, 35]
+        counts = sorted(collections.Counter(ages).items())
+        percentiles = (0, 10, 50, 90, 99, 100)
+        stats = RunningStats()
+        for age in ages:
+            stats.add(age)
+        result = stream_ages._stats_from_counts(counts, percentiles)
+        self.assertEqual(result["count"], len(ages))
+        self.assertAlmostEqual(result["avg"], statistics.mean(ages))
+        self.assertEqual((result["min"], result["max"]), (-5, 90))
+        self.assertEqual(result["percentiles"],
+                         {p: stats.percentile(p) for p in percentiles})
+
+    def test_empty(self):
+        self.assertEqual(stream_ages._stats_from_counts([], (50,)), {
+            "count": 0, "avg": None, "min": None, "max": None,
+            "percentiles": {50: None}})
+
+
+if __name__ == '__main__':
+    unittest.main()